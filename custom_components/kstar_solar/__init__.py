@@ -2,15 +2,42 @@
 from __future__ import annotations
 
 import logging
+import time
+from collections.abc import Mapping
 from typing import Any
 
+import aiohttp
+
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
-from homeassistant.exceptions import ConfigEntryNotReady
-
-from .const import DOMAIN
-from .kstar_api import KstarSolarAPI
+from homeassistant.helpers.storage import STORAGE_DIR, Store
+
+from .const import (
+    CONF_CACHE_TTL,
+    CONF_CAPACITY,
+    CONF_DISCOVER_FIELDS,
+    CONF_MAX_CONCURRENCY,
+    CONF_RATE_LIMIT,
+    CONF_RETRY_BUDGET,
+    CONF_TIMEOUT,
+    DATA_SESSIONS,
+    DATA_VALIDATED,
+    DEFAULT_CACHE_TTL,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_RETRY_BUDGET,
+    DEFAULT_TIMEOUT,
+    DOMAIN,
+    SCHEMA_STORAGE_VERSION,
+    TOKEN_SAVE_DELAY,
+    TOKEN_STORAGE_VERSION,
+    VALIDATED_MAX_AGE,
+)
+from .coordinator import KstarSolarCoordinator
+from .journal import SnapshotJournal
+from .kstar_api import KstarSolarAPI, create_session, parse_station_ids
+from .services import async_setup_services
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -19,6 +46,7 @@ PLATFORMS: list[Platform] = [Platform.SENSOR]
 
 async def async_setup(hass: HomeAssistant, config: dict[str, Any]) -> bool:
     """Set up the Kstar Solar Inverter component."""
+    async_setup_services(hass)
     return True
 
 
@@ -26,26 +54,75 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Kstar Solar Inverter from a config entry."""
     hass.data.setdefault(DOMAIN, {})
 
-    # Create API client based on configuration
-    api = KstarSolarAPI(
-        host=entry.data["host"],
-        station_id=entry.data["station_id"],
-        username=entry.data["username"],
-        password=entry.data["password"],
-    )
+    host = entry.data["host"].rstrip("/")
+    station_ids = parse_station_ids(entry.data["station_id"])
+    session = _async_acquire_session(hass, host, entry.entry_id)
+    token_store = _token_store(hass, entry.entry_id)
 
-    # Test the connection
+    api: KstarSolarAPI | None = None
+    coordinator: KstarSolarCoordinator | None = None
     try:
-        await api.get_station_data()
-    except Exception as ex:
-        _LOGGER.error("Failed to connect to Kstar Solar API: %s", ex)
-        await api.close()
-        raise ConfigEntryNotReady from ex
-
-    hass.data[DOMAIN][entry.entry_id] = api
-
-    # Set up platforms
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+        # 优先复用配置流程中已登录的客户端和已拉取的数据
+        api, initial_data = _pop_validated(hass, entry)
+        if api is not None:
+            await api.use_session(session)
+            token_store.async_delay_save(api.export_tokens, TOKEN_SAVE_DELAY)
+        else:
+            # Create API client based on configuration
+            api = KstarSolarAPI(
+                host=host,
+                station_id=station_ids[0],
+                username=entry.data["username"],
+                password=entry.data["password"],
+                session=session,
+            )
+
+            # 恢复上次保存的 token，避免每次重启都重新登录
+            if api.restore_tokens(await token_store.async_load() or {}):
+                _LOGGER.debug("Restored saved tokens for %s", entry.title)
+
+        _apply_client_options(api, entry.options)
+        api.set_token_listener(
+            lambda tokens: token_store.async_delay_save(lambda: tokens, TOKEN_SAVE_DELAY)
+        )
+
+        schema_store = None
+        if entry.options.get(CONF_DISCOVER_FIELDS, False):
+            schema_store = _schema_store(hass, entry.entry_id)
+            api.keep_all_fields = True
+
+        coordinator = KstarSolarCoordinator(
+            hass,
+            api,
+            station_ids,
+            entry.options,
+            _journal(hass, entry.entry_id),
+            schema_store,
+        )
+        await coordinator.async_load_schema()
+        if initial_data is not None:
+            coordinator.async_seed(initial_data)
+        else:
+            # 不在启动路径上等待云端：先用日志中的读数（如有），首次请求在后台完成
+            await coordinator.async_restore()
+            entry.async_create_background_task(
+                hass, coordinator.async_refresh(), f"{DOMAIN} first refresh {entry.title}"
+            )
+
+        hass.data[DOMAIN][entry.entry_id] = coordinator
+
+        # Set up platforms
+        await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+        entry.async_on_unload(entry.add_update_listener(_async_options_updated))
+    except Exception:
+        # 设置失败时释放共享连接池，避免占用和泄漏客户端
+        hass.data[DOMAIN].pop(entry.entry_id, None)
+        if coordinator is not None:
+            await coordinator.async_shutdown()
+        if api is not None:
+            await api.close()
+        await _async_release_session(hass, host, entry.entry_id)
+        raise
 
     return True
 
@@ -53,11 +130,100 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        api = hass.data[DOMAIN].pop(entry.entry_id)
-        await api.close()
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.api.close()
+        await _async_release_session(hass, coordinator.api.host, entry.entry_id)
 
     return unload_ok
 
 
-# Import config flow to register it
-from . import config_flow 
\ No newline at end of file
+def _apply_client_options(api: KstarSolarAPI, options: Mapping[str, Any]) -> None:
+    """Apply the request options to a client; safe to call while it is in use."""
+    api.set_timeout(options.get(CONF_TIMEOUT, DEFAULT_TIMEOUT))
+    api.set_concurrency(
+        options.get(CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY),
+        options.get(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT),
+    )
+    api.retry_budget = options.get(CONF_RETRY_BUDGET, DEFAULT_RETRY_BUDGET)
+    api.cache_ttl = options.get(CONF_CACHE_TTL, DEFAULT_CACHE_TTL)
+
+
+async def _async_options_updated(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply new options to the running client and coordinator."""
+    coordinator: KstarSolarCoordinator = hass.data[DOMAIN][entry.entry_id]
+    old, new = coordinator.options, entry.options
+    # 这两项决定创建哪些实体，只能重新加载
+    if old.get(CONF_DISCOVER_FIELDS, False) != new.get(CONF_DISCOVER_FIELDS, False) or (
+        bool(old.get(CONF_CAPACITY)) != bool(new.get(CONF_CAPACITY))
+    ):
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+
+    _apply_client_options(coordinator.api, new)
+    coordinator.async_apply_options(new)
+    _LOGGER.debug("Applied new options to %s", entry.title)
+
+
+def _pop_validated(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> tuple[KstarSolarAPI | None, dict[str, dict[str, Any]] | None]:
+    """Take over the client and payload validated by the config flow, if fresh."""
+    pending = hass.data[DOMAIN].get(DATA_VALIDATED, {}).pop(entry.unique_id, None)
+    if pending is None:
+        return None, None
+    api, data, validated_at = pending
+    if time.monotonic() - validated_at > VALIDATED_MAX_AGE:
+        hass.async_create_task(api.close())
+        return None, None
+    return api, data
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove persisted tokens, readings and schema when a config entry is deleted."""
+    await _token_store(hass, entry.entry_id).async_remove()
+    await _schema_store(hass, entry.entry_id).async_remove()
+    await hass.async_add_executor_job(_journal(hass, entry.entry_id).remove)
+
+
+def _token_store(hass: HomeAssistant, entry_id: str) -> Store:
+    """Return the token storage for a config entry."""
+    return Store(hass, TOKEN_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.tokens")
+
+
+def _schema_store(hass: HomeAssistant, entry_id: str) -> Store:
+    """Return the discovered field schema storage for a config entry."""
+    return Store(hass, SCHEMA_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.schema")
+
+
+def _journal(hass: HomeAssistant, entry_id: str) -> SnapshotJournal:
+    """Return the snapshot journal for a config entry."""
+    return SnapshotJournal(hass.config.path(STORAGE_DIR, f"{DOMAIN}.{entry_id}.journal"))
+
+
+def _async_acquire_session(
+    hass: HomeAssistant, host: str, entry_id: str
+) -> aiohttp.ClientSession:
+    """Return the shared session for a host, creating it on first use."""
+    sessions = hass.data[DOMAIN].setdefault(DATA_SESSIONS, {})
+    session, users = sessions.get(host, (None, set()))
+    if session is None or session.closed:
+        _LOGGER.debug("Creating shared HTTP session for %s", host)
+        session = create_session()
+    users.add(entry_id)
+    sessions[host] = (session, users)
+    return session
+
+
+async def _async_release_session(
+    hass: HomeAssistant, host: str, entry_id: str
+) -> None:
+    """Drop an entry's claim on a shared session, closing it when unused."""
+    sessions = hass.data[DOMAIN].get(DATA_SESSIONS, {})
+    if host not in sessions:
+        return
+    session, users = sessions[host]
+    users.discard(entry_id)
+    if not users:
+        del sessions[host]
+        _LOGGER.debug("Closing shared HTTP session for %s", host)
+        await session.close()
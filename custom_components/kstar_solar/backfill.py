@@ -0,0 +1,190 @@
+"""Backfill Kstar cloud history into long-term statistics."""
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    statistics_during_period,
+)
+from homeassistant.const import UnitOfEnergy, UnitOfPower
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util, slugify
+
+from .const import BACKFILL_BATCH_DAYS, BACKFILL_STORAGE_VERSION, DOMAIN
+from .coordinator import KstarSolarCoordinator
+from .models import HistoryDay
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def energy_statistic_id(station_id: str) -> str:
+    """Return the external statistic id for a station's generated energy."""
+    return f"{DOMAIN}:station_{slugify(station_id)}_energy"
+
+
+def power_statistic_id(station_id: str) -> str:
+    """Return the external statistic id for a station's power."""
+    return f"{DOMAIN}:station_{slugify(station_id)}_power"
+
+
+class HistoryBackfill:
+    """Stream a station's history into statistics, resumable from a checkpoint.
+
+    The history goes into separate external statistics (see
+    ``energy_statistic_id``), not into the statistics of the live sensors.
+    The energy sum of a run continues from the row before ``start``, and
+    rows after ``end`` are shifted by the energy the run added, so ranges
+    can be imported in any order.
+
+    The checkpoint keeps, per station, the range of the last run with its
+    last imported day and running sum. Calling again with the same range
+    continues where an interrupted run stopped; any other range, or a run
+    that finished, starts over.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, coordinator: KstarSolarCoordinator, entry_id: str
+    ) -> None:
+        self.hass = hass
+        self.coordinator = coordinator
+        self._store: Store[dict[str, Any]] = Store(
+            hass, BACKFILL_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.backfill"
+        )
+
+    async def async_run(self, station_id: str, start: date, end: date) -> int:
+        """Import ``start``..``end`` for one station and return the days imported."""
+        if start > end:
+            return 0
+        statistic_id = energy_statistic_id(station_id)
+        run = {"start": start.isoformat(), "end": end.isoformat()}
+        checkpoints = await self._store.async_load() or {}
+        checkpoint = checkpoints.get(station_id, {})
+
+        if not checkpoint.get("done", True) and all(
+            checkpoint.get(key) == value for key, value in run.items()
+        ):
+            energy_sum = checkpoint["sum"]
+            end_sum = checkpoint["end_sum"]
+            if last_day := checkpoint.get("last_day"):
+                start = date.fromisoformat(last_day) + timedelta(days=1)
+                _LOGGER.info("Resuming backfill of station %s from %s", station_id, start)
+        else:
+            energy_sum = await self._async_sum_before(statistic_id, start)
+            # 导入前区间末尾的累计值，用来平移区间之后已有的行
+            end_sum = await self._async_sum_before(statistic_id, end + timedelta(days=1))
+            run.update(last_day=None, sum=energy_sum, end_sum=end_sum, done=False)
+            checkpoints[station_id] = run
+            await self._store.async_save(checkpoints)
+
+        energy_rows: list[StatisticData] = []
+        power_rows: list[StatisticData] = []
+        imported = 0
+        pending_days = 0
+        async for history in self.coordinator.api.iter_history(start, end, station_id):
+            energy_sum = _append_day(history, energy_sum, energy_rows, power_rows)
+            imported += 1
+            pending_days += 1
+            if pending_days >= BACKFILL_BATCH_DAYS:
+                await self._flush(station_id, energy_rows, power_rows, history.day, energy_sum)
+                energy_rows, power_rows, pending_days = [], [], 0
+
+        if pending_days:
+            await self._flush(station_id, energy_rows, power_rows, end, energy_sum)
+        if energy_sum != end_sum:
+            get_instance(self.hass).async_adjust_statistics(
+                statistic_id,
+                dt_util.start_of_local_day(end + timedelta(days=1)),
+                energy_sum - end_sum,
+                UnitOfEnergy.KILO_WATT_HOUR,
+            )
+        checkpoints = await self._store.async_load() or {}
+        checkpoints[station_id]["done"] = True
+        await self._store.async_save(checkpoints)
+        _LOGGER.info("Backfilled %d days of history for station %s", imported, station_id)
+        return imported
+
+    async def _async_sum_before(self, statistic_id: str, day: date) -> float:
+        """Return the energy sum of the last row before local midnight of ``day``."""
+        rows = await get_instance(self.hass).async_add_executor_job(
+            statistics_during_period,
+            self.hass,
+            datetime.fromtimestamp(0, dt_util.UTC),
+            dt_util.start_of_local_day(day),
+            {statistic_id},
+            # 按月汇总时每行的 sum 就是该月最后一小时的累计值
+            "month",
+            None,
+            {"sum"},
+        )
+        series = rows.get(statistic_id)
+        if not series:
+            return 0.0
+        return series[-1].get("sum") or 0.0
+
+    async def _flush(
+        self,
+        station_id: str,
+        energy_rows: list[StatisticData],
+        power_rows: list[StatisticData],
+        last_day: date,
+        energy_sum: float,
+    ) -> None:
+        """Import one batch of rows, then advance the checkpoint."""
+        if energy_rows:
+            async_add_external_statistics(
+                self.hass,
+                StatisticMetaData(
+                    has_mean=False,
+                    has_sum=True,
+                    name=f"Kstar Solar {station_id} 发电量",
+                    source=DOMAIN,
+                    statistic_id=energy_statistic_id(station_id),
+                    unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+                ),
+                energy_rows,
+            )
+        if power_rows:
+            async_add_external_statistics(
+                self.hass,
+                StatisticMetaData(
+                    has_mean=True,
+                    has_sum=False,
+                    name=f"Kstar Solar {station_id} 功率",
+                    source=DOMAIN,
+                    statistic_id=power_statistic_id(station_id),
+                    unit_of_measurement=UnitOfPower.WATT,
+                ),
+                power_rows,
+            )
+
+        checkpoints = await self._store.async_load() or {}
+        checkpoints[station_id].update(last_day=last_day.isoformat(), sum=energy_sum)
+        await self._store.async_save(checkpoints)
+
+
+def _append_day(
+    history: HistoryDay,
+    energy_sum: float,
+    energy_rows: list[StatisticData],
+    power_rows: list[StatisticData],
+) -> float:
+    """Add one day's hourly rows and return the updated running energy sum."""
+    midnight = dt_util.start_of_local_day(history.day)
+    day_energy = 0.0
+    for hour, (energy, power) in enumerate(
+        zip(history.hourly_energy(), history.hourly_power())
+    ):
+        start = midnight + timedelta(hours=hour)
+        day_energy += energy
+        energy_sum += energy
+        energy_rows.append(StatisticData(start=start, state=day_energy, sum=energy_sum))
+        if power is not None:
+            mean, low, high = power
+            power_rows.append(StatisticData(start=start, mean=mean, min=low, max=high))
+    return energy_sum
@@ -1,13 +1,44 @@
 """Config flow for Kstar Solar Inverter integration."""
 import logging
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, Mapping, Optional
 import voluptuous as vol
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
-from .const import DOMAIN, DEFAULT_HOST
-from .kstar_api import KstarSolarAPI
+from .const import (
+    CONF_CACHE_TTL,
+    CONF_CAPACITY,
+    CONF_DISCOVER_FIELDS,
+    CONF_MAX_CONCURRENCY,
+    CONF_MAX_INTERVAL,
+    CONF_MAX_STALENESS,
+    CONF_MIN_INTERVAL,
+    CONF_NIGHT_INTERVAL,
+    CONF_RATE_LIMIT,
+    CONF_RETRY_BUDGET,
+    CONF_TIMEOUT,
+    CONNECTION_LIMIT_PER_HOST,
+    DATA_VALIDATED,
+    DEFAULT_CACHE_TTL,
+    DEFAULT_HOST,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_MAX_STALENESS,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_NIGHT_INTERVAL,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_RETRY_BUDGET,
+    DEFAULT_TIMEOUT,
+    DOMAIN,
+)
+from .kstar_api import (
+    KstarAuthError,
+    KstarError,
+    KstarSolarAPI,
+    parse_station_ids,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -17,11 +48,48 @@ class CannotConnect(HomeAssistantError):
 class InvalidAuth(HomeAssistantError):
     """Error to indicate there is invalid auth."""
 
+async def _validate(
+    host: str, station_ids: list[str], username: str, password: str
+) -> tuple[KstarSolarAPI, Dict[str, Any]]:
+    """Log in and fetch every station; return the client and the payloads."""
+    api = KstarSolarAPI(
+        host=host,
+        station_id=station_ids[0],
+        username=username,
+        password=password,
+    )
+    try:
+        results = await api.get_stations_data(station_ids)
+        for result in results.values():
+            if isinstance(result, Exception):
+                raise result
+    except KstarAuthError as err:
+        await api.close()
+        raise InvalidAuth from err
+    except KstarError as err:
+        await api.close()
+        raise CannotConnect from err
+    except Exception:
+        await api.close()
+        raise
+    return api, results
+
+
 class KstarSolarConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for Kstar Solar Inverter."""
 
     VERSION = 2
 
+    _reauth_entry: Optional[config_entries.ConfigEntry] = None
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> "KstarSolarOptionsFlow":
+        """Return the options flow."""
+        return KstarSolarOptionsFlow(config_entry)
+
     async def async_step_user(
         self, user_input: Optional[Dict[str, Any]] = None
     ) -> FlowResult:
@@ -29,31 +97,37 @@ class KstarSolarConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         errors = {}
 
         if user_input is not None:
+            host = user_input["host"].rstrip("/")
+            if not host.startswith(("http://", "https://")):
+                host = f"http://{host}"
+            station_ids = parse_station_ids(user_input["station_id"])
+
+            await self.async_set_unique_id(f"{host}/{','.join(station_ids)}")
+            self._abort_if_unique_id_configured()
+
             try:
-                host = user_input["host"].rstrip("/")
-                if not host.startswith(("http://", "https://")):
-                    host = f"http://{host}"
-
-                api = KstarSolarAPI(
-                    host=host,
-                    station_id=user_input["station_id"],
-                    username=user_input["username"],
-                    password=user_input["password"],
+                if not station_ids:
+                    raise CannotConnect
+
+                # Test login and data fetch for every station
+                api, results = await _validate(
+                    host, station_ids, user_input["username"], user_input["password"]
                 )
 
-                # Test login and data fetch
-                await api.get_station_data()
-                await api.close()
+                # 把已登录的客户端和数据交给 async_setup_entry，避免重复登录和拉取
+                self.hass.data.setdefault(DOMAIN, {}).setdefault(DATA_VALIDATED, {})[
+                    self.unique_id
+                ] = (api, results, time.monotonic())
 
                 config_data = {
                     "host": host,
-                    "station_id": user_input["station_id"],
+                    "station_id": ",".join(station_ids),
                     "username": user_input["username"],
                     "password": user_input["password"],
                 }
 
                 return self.async_create_entry(
-                    title=f"Kstar Solar - {user_input['station_id']}",
+                    title=f"Kstar Solar - {', '.join(station_ids)}",
                     data=config_data,
                 )
 
@@ -78,6 +152,129 @@ class KstarSolarConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=errors,
         )
 
+    async def async_step_reauth(self, entry_data: Mapping[str, Any]) -> FlowResult:
+        """Ask for a new password after the cloud rejected the stored one."""
+        self._reauth_entry = self.hass.config_entries.async_get_entry(
+            self.context["entry_id"]
+        )
+        return await self.async_step_reauth_confirm()
+
+    async def async_step_reauth_confirm(
+        self, user_input: Optional[Dict[str, Any]] = None
+    ) -> FlowResult:
+        """Validate the new password and reload the entry."""
+        errors = {}
+        entry = self._reauth_entry
+        assert entry is not None
+
+        if user_input is not None:
+            data = {**entry.data, "password": user_input["password"]}
+            try:
+                api, _ = await _validate(
+                    data["host"],
+                    parse_station_ids(data["station_id"]),
+                    data["username"],
+                    data["password"],
+                )
+                await api.close()
+            except CannotConnect:
+                errors["base"] = "cannot_connect"
+            except InvalidAuth:
+                errors["base"] = "invalid_auth"
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Unexpected exception")
+                errors["base"] = "unknown"
+            else:
+                self.hass.config_entries.async_update_entry(entry, data=data)
+                await self.hass.config_entries.async_reload(entry.entry_id)
+                return self.async_abort(reason="reauth_successful")
+
+        return self.async_show_form(
+            step_id="reauth_confirm",
+            data_schema=vol.Schema({vol.Required("password"): str}),
+            description_placeholders={"username": entry.data["username"]},
+            errors=errors,
+        )
+
     async def async_step_import(self, import_info: Dict[str, Any]) -> FlowResult:
         """Set up this integration using yaml."""
         return await self.async_step_user(import_info)
+
+
+def _seconds(minimum: int, maximum: int) -> vol.All:
+    return vol.All(vol.Coerce(int), vol.Range(min=minimum, max=maximum))
+
+
+class KstarSolarOptionsFlow(config_entries.OptionsFlow):
+    """Tune polling, request limits and caching of an entry.
+
+    Everything except ``discover_fields`` and switching the capacity on or
+    off is applied to the running client and coordinator without a reload.
+    """
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """Initialize the options flow."""
+        self._entry = config_entry
+
+    async def async_step_init(
+        self, user_input: Optional[Dict[str, Any]] = None
+    ) -> FlowResult:
+        """Show and validate the options form."""
+        errors = {}
+
+        if user_input is not None:
+            if user_input[CONF_MAX_INTERVAL] < user_input[CONF_MIN_INTERVAL]:
+                errors[CONF_MAX_INTERVAL] = "max_below_min"
+            else:
+                return self.async_create_entry(title="", data=user_input)
+
+        options = {**self._entry.options, **(user_input or {})}
+        schema = vol.Schema({
+            vol.Required(
+                CONF_MIN_INTERVAL,
+                default=options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL),
+            ): _seconds(10, 3600),
+            vol.Required(
+                CONF_MAX_INTERVAL,
+                default=options.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL),
+            ): _seconds(10, 86400),
+            vol.Required(
+                CONF_NIGHT_INTERVAL,
+                default=options.get(CONF_NIGHT_INTERVAL, DEFAULT_NIGHT_INTERVAL),
+            ): _seconds(60, 86400),
+            vol.Required(
+                CONF_TIMEOUT,
+                default=options.get(CONF_TIMEOUT, DEFAULT_TIMEOUT),
+            ): _seconds(5, 300),
+            vol.Required(
+                CONF_MAX_CONCURRENCY,
+                default=options.get(CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY),
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=CONNECTION_LIMIT_PER_HOST)),
+            vol.Required(
+                CONF_RATE_LIMIT,
+                default=options.get(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT),
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+            vol.Required(
+                CONF_RETRY_BUDGET,
+                default=options.get(CONF_RETRY_BUDGET, DEFAULT_RETRY_BUDGET),
+            ): _seconds(0, 600),
+            vol.Required(
+                CONF_CACHE_TTL,
+                default=options.get(CONF_CACHE_TTL, DEFAULT_CACHE_TTL),
+            ): _seconds(0, 3600),
+            vol.Required(
+                CONF_MAX_STALENESS,
+                default=options.get(CONF_MAX_STALENESS, DEFAULT_MAX_STALENESS),
+            ): _seconds(0, 86400),
+            # 留空表示未配置装机容量
+            vol.Optional(
+                CONF_CAPACITY,
+                description={"suggested_value": options.get(CONF_CAPACITY)},
+            ): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+            vol.Required(
+                CONF_DISCOVER_FIELDS,
+                default=options.get(CONF_DISCOVER_FIELDS, False),
+            ): bool,
+        })
+
+        return self.async_show_form(step_id="init", data_schema=schema, errors=errors)
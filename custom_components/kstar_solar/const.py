@@ -9,9 +9,97 @@ DEFAULT_HOST = "http://solar.kstar.com.cn:9003"
 # 更新间隔
 SCAN_INTERVAL = timedelta(minutes=5)
 
+# 自适应轮询（单位：秒）
+CONF_MIN_INTERVAL = "min_interval"
+CONF_MAX_INTERVAL = "max_interval"
+CONF_NIGHT_INTERVAL = "night_interval"
+DEFAULT_MIN_INTERVAL = 60
+DEFAULT_MAX_INTERVAL = 900
+DEFAULT_NIGHT_INTERVAL = 1800
+
+# hass.data 中的共享数据
+DATA_VALIDATED = "validated"
+VALIDATED_MAX_AGE = 60  # 配置流程验证结果的最长复用时间（秒）
+
+# 共享连接池
+DATA_SESSIONS = "sessions"
+DNS_CACHE_TTL = 300
+CONNECTION_LIMIT_PER_HOST = 8
+KEEPALIVE_TIMEOUT = 60
+MAX_RESPONSE_BYTES = 1024 * 1024  # 单个响应体的读取上限
+
+# Token 持久化与提前刷新
+TOKEN_STORAGE_VERSION = 1
+TOKEN_SAVE_DELAY = 1
+TOKEN_REFRESH_MARGIN = 300  # 过期前多少秒在后台刷新
+TOKEN_EXPIRY_GRACE = 10  # 剩余不足多少秒视为已过期
+
+# 请求超时与响应缓存（单位：秒）
+CONF_TIMEOUT = "timeout"
+DEFAULT_TIMEOUT = 30
+CONF_CACHE_TTL = "cache_ttl"
+DEFAULT_CACHE_TTL = 30  # 该时间内重复请求同一电站直接返回上次的数据，0 表示不缓存
+
+# 熔断：连续失败后暂停请求云端，按指数退避（单位：秒）
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_BASE_BACKOFF = 60
+BREAKER_MAX_BACKOFF = 1800
+
+# 重试：超时、连接错误、5xx 和 429 按带抖动的指数退避重试（单位：秒）
+CONF_RETRY_BUDGET = "retry_budget"
+DEFAULT_RETRY_BUDGET = 60  # 每个请求从首次发出到最后一次重试的时长上限，0 表示不重试
+RETRY_ATTEMPTS = 3  # 首次请求之外最多重试的次数
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 30
+RETRY_AFTER_MAX = 300  # 服务端 Retry-After 的采纳上限
+
+# 多电站批量轮询
+CONF_MAX_CONCURRENCY = "max_concurrency"
+CONF_RATE_LIMIT = "rate_limit"
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_RATE_LIMIT = 5.0  # 每秒最多请求数，0 表示不限制
+
+# 本地功率积分
+CONF_CAPACITY = "capacity"  # 装机容量（kWp），用于计算容量系数
+INTEGRATION_WINDOW = 3600  # 峰值和平均功率的滚动窗口（秒）
+INTEGRATION_BUFFER_SIZE = 288  # 每个电站最多保留的功率采样数
+INTEGRATION_MAX_GAP = 3600  # 超过该间隔（秒）的相邻采样不做积分
+
+# 读数日志与过期数据
+CONF_MAX_STALENESS = "max_staleness"
+DEFAULT_MAX_STALENESS = 3600  # 云端故障时继续提供旧读数的最长时间（秒），0 表示立即不可用
+JOURNAL_MAX_BYTES = 256 * 1024  # 单个日志文件的大小上限，超过后轮转
+JOURNAL_BACKUPS = 1
+
+# 字段发现
+CONF_DISCOVER_FIELDS = "discover_fields"
+SCHEMA_STORAGE_VERSION = 1
+SCHEMA_SAVE_DELAY = 10
+
+# 逆变器详情按较慢的节奏轮询，只请求有已启用实体的逆变器
+INVERTER_SCAN_INTERVAL = timedelta(minutes=15)
+INVERTER_REFRESH_COOLDOWN = 2  # 秒
+# 列出逆变器遇到连接错误时的重试退避（秒），每次失败翻倍
+INVERTER_DISCOVERY_BASE_BACKOFF = 60
+INVERTER_DISCOVERY_MAX_BACKOFF = 3600
+
 # API endpoints
 LOGIN_URL = "/prod-api/authentication/form"
 STATION_DETAIL_URL = "/prod-api/station/detail/earn"
+STATION_DAY_CURVE_URL = "/prod-api/station/power/day"
+STATION_MONTH_GENERATION_URL = "/prod-api/station/generation/month"
+INVERTER_LIST_URL = "/prod-api/station/inverter/list"
+INVERTER_DETAIL_URL = "/prod-api/inverter/detail"
+
+# 历史数据回填
+SERVICE_BACKFILL_HISTORY = "backfill_history"
+BACKFILL_STORAGE_VERSION = 1
+BACKFILL_BATCH_DAYS = 7  # 每累计多少天导入一次统计并保存进度
+
+# 按需读取电站数据的服务；缓存时长沿用 cache_ttl 选项
+SERVICE_GET_STATION_SNAPSHOT = "get_station_snapshot"
+DATA_FORCED_REFRESH = "forced_refresh"
+FORCE_REFRESH_INTERVAL = 60  # 每个条目强制刷新的最短间隔（秒）
 
 # 传感器类型
 SENSOR_TYPES = {
@@ -0,0 +1,568 @@
+"""Data update coordinator for Kstar Solar Inverter."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable, Mapping
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import (
+    DataUpdateCoordinator,
+    UpdateFailed,
+)
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    CONF_CAPACITY,
+    CONF_MAX_INTERVAL,
+    CONF_MAX_STALENESS,
+    CONF_MIN_INTERVAL,
+    CONF_NIGHT_INTERVAL,
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_MAX_STALENESS,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_NIGHT_INTERVAL,
+    DOMAIN,
+    INVERTER_DISCOVERY_BASE_BACKOFF,
+    INVERTER_DISCOVERY_MAX_BACKOFF,
+    INVERTER_REFRESH_COOLDOWN,
+    INVERTER_SCAN_INTERVAL,
+    SCAN_INTERVAL,
+    SCHEMA_SAVE_DELAY,
+)
+from .integrator import PowerIntegrator
+from .journal import SnapshotJournal
+from .kstar_api import KstarAuthError, KstarError, KstarSolarAPI
+from .models import (
+    INTEGRATED_FIELDS,
+    SNAPSHOT_FIELDS,
+    InverterInfo,
+    InverterSnapshot,
+    StationSnapshot,
+    discover_numeric_fields,
+)
+from .scheduler import AdaptivePollScheduler
+
+SUN_ENTITY_ID = "sun.sun"
+
+# 本地积分传感器注册的监听上下文字段
+INTEGRATED_CONTEXT = "integrated"
+
+# (station_id, 新增字段, 移除字段)
+SchemaListener = Callable[[str, list[str], list[str]], None]
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class KstarSolarCoordinator(DataUpdateCoordinator[dict[str, StationSnapshot]]):
+    """Poll every station of an account in one batch.
+
+    ``data`` maps each station id to its latest parsed snapshot. Entities
+    register with a ``(station_id, field)`` context and are only called back
+    when that field changed. Each fresh realPower sample also feeds the
+    station's ``PowerIntegrator``.
+
+    Fresh snapshots are appended to the journal, if one is given. Stations
+    whose snapshot was not refreshed by the last poll are ``stale`` and stay
+    available until the snapshot is older than the staleness limit.
+
+    With a schema store the coordinator also discovers numeric fields beyond
+    ``SNAPSHOT_FIELDS``. A station's payload is only inspected again when its
+    set of top-level keys changes; schema listeners hear about added and
+    removed fields.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        api: KstarSolarAPI,
+        station_ids: list[str],
+        options: Mapping[str, Any] | None = None,
+        journal: SnapshotJournal | None = None,
+        schema_store: Store | None = None,
+    ) -> None:
+        """Initialize the coordinator."""
+        options = options or {}
+        self.scheduler = AdaptivePollScheduler(
+            min_interval=options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL),
+            max_interval=options.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL),
+            night_interval=options.get(CONF_NIGHT_INTERVAL, DEFAULT_NIGHT_INTERVAL),
+            initial_interval=SCAN_INTERVAL.total_seconds(),
+        )
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=DOMAIN,
+            # 首次间隔也加抖动，避免多个条目同时请求
+            update_interval=timedelta(seconds=self.scheduler.jittered_interval()),
+        )
+        self.api = api
+        self.station_ids = station_ids
+        self.options = dict(options)
+        self.journal = journal
+        self.max_staleness = options.get(CONF_MAX_STALENESS, DEFAULT_MAX_STALENESS)
+        self.stale_stations: set[str] = set()
+        # 上次轮询拿到结果的 time.monotonic()，之后取得的数据都算新数据
+        self._last_poll_done: float | None = None
+        capacity = options.get(CONF_CAPACITY)
+        self.integrators = {
+            station_id: PowerIntegrator(capacity=capacity) for station_id in station_ids
+        }
+        self.schema_store = schema_store
+        self.schema: dict[str, tuple[str, ...]] = {}
+        self._payload_keys: dict[str, frozenset[str]] = {}
+        self._schema_listeners: list[SchemaListener] = []
+        self.inverter_coordinator = KstarInverterCoordinator(hass, api)
+        self._unsub_staleness: CALLBACK_TYPE | None = None
+        # None 表示通知所有实体
+        self._changed_fields: set[tuple[str, str]] | None = None
+        self._notified_success = True
+
+    @callback
+    def async_apply_options(self, options: Mapping[str, Any]) -> None:
+        """Apply changed options without reloading the entry."""
+        self.options = dict(options)
+        self.scheduler.set_bounds(
+            options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL),
+            options.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL),
+            options.get(CONF_NIGHT_INTERVAL, DEFAULT_NIGHT_INTERVAL),
+        )
+        self.max_staleness = options.get(CONF_MAX_STALENESS, DEFAULT_MAX_STALENESS)
+        self._schedule_staleness_check(self.data or {})
+        capacity = options.get(CONF_CAPACITY)
+        for integrator in self.integrators.values():
+            integrator.capacity = capacity
+
+        # 按新的间隔重新安排下一次轮询
+        self.update_interval = timedelta(seconds=self.scheduler.jittered_interval())
+        if self._listeners:
+            self._schedule_refresh()
+        if self.data is not None:
+            # 可用性和容量系数可能随选项变化
+            self.async_update_listeners()
+
+    @callback
+    def async_seed(self, payloads: dict[str, dict[str, Any]]) -> None:
+        """Use payloads fetched elsewhere (e.g. by the config flow) as current data."""
+        data = {
+            station_id: self._snapshot(station_id, payload)
+            for station_id, payload in payloads.items()
+        }
+        self._integrate(data)
+        self.async_set_updated_data(data)
+
+    async def async_restore(self) -> bool:
+        """Serve the journal's latest snapshots until the first fetch completes."""
+        if self.journal is None:
+            return False
+        try:
+            restored = await self.hass.async_add_executor_job(self.journal.load_latest)
+        except OSError as err:
+            _LOGGER.warning("Could not read snapshot journal: %s", err)
+            return False
+        data = {
+            station_id: snapshot
+            for station_id, snapshot in restored.items()
+            if station_id in self.station_ids
+        }
+        if not data:
+            return False
+        _LOGGER.debug("Restored %d station snapshots from the journal", len(data))
+        self.stale_stations = set(data)
+        self._integrate(data)
+        self.async_set_updated_data(data)
+        self._schedule_staleness_check(data)
+        return True
+
+    async def async_load_schema(self) -> None:
+        """Load the field schema discovered by a previous run."""
+        if self.schema_store is None:
+            return
+        stored = await self.schema_store.async_load() or {}
+        for station_id, station in stored.get("stations", {}).items():
+            # 旧版本可能保存了与积分传感器同名的字段
+            self.schema[station_id] = tuple(
+                key for key in station["fields"] if key not in INTEGRATED_FIELDS
+            )
+            self._payload_keys[station_id] = frozenset(station["keys"])
+
+    @callback
+    def async_add_schema_listener(self, listener: SchemaListener) -> CALLBACK_TYPE:
+        """Call ``listener`` whenever a station's discovered fields change."""
+        self._schema_listeners.append(listener)
+
+        @callback
+        def remove_listener() -> None:
+            self._schema_listeners.remove(listener)
+
+        return remove_listener
+
+    def station_available(self, station_id: str) -> bool:
+        """Return True if the station's snapshot may still be shown."""
+        snapshot = (self.data or {}).get(station_id)
+        if snapshot is None:
+            return False
+        if station_id not in self.stale_stations:
+            return self.last_update_success
+        return time.time() - snapshot.fetched_at <= self.max_staleness
+
+    async def _async_update_data(self) -> dict[str, StationSnapshot]:
+        """Fetch all stations, keeping the previous data for any that fail.
+
+        Payloads the client served from its cache or from the circuit
+        breaker's last good data keep their real fetch time. They count as
+        fresh if fetched after the previous poll, e.g. by the snapshot
+        service, and as stale like failed stations otherwise.
+        """
+        fresh_since = self._last_poll_done
+        if fresh_since is None:
+            fresh_since = time.monotonic()
+        try:
+            with self.api.stats.timed("poll"):
+                results = await self.api.get_stations_data(self.station_ids)
+            self._last_poll_done = time.monotonic()
+        except Exception as err:
+            self.stale_stations = set(self.data or ())
+            self._schedule_staleness_check(self.data or {})
+            raise UpdateFailed(f"Failed to get station data: {err}") from err
+
+        previous = self.data or {}
+        was_stale = self.stale_stations
+        data: dict[str, StationSnapshot] = {}
+        fresh: dict[str, StationSnapshot] = {}
+        errors: list[Exception] = []
+        for station_id, result in results.items():
+            if isinstance(result, Exception):
+                errors.append(result)
+                _LOGGER.warning("Failed to update station %s: %s", station_id, result)
+                if station_id in previous:
+                    data[station_id] = previous[station_id]
+                continue
+            age = self.api.data_age(station_id) or 0.0
+            fetched_at = time.time() - age
+            if age > time.monotonic() - fresh_since:
+                # 上次轮询之前取得的数据，沿用原来的读数时间
+                old = previous.get(station_id)
+                if old is not None and old.fetched_at >= fetched_at - 1:
+                    data[station_id] = old
+                else:
+                    data[station_id] = self._snapshot(station_id, result, fetched_at)
+                continue
+            with self.api.stats.timed("snapshot"):
+                data[station_id] = fresh[station_id] = self._snapshot(
+                    station_id, result, fetched_at
+                )
+
+        self.stale_stations = set(data) - set(fresh)
+        self._schedule_staleness_check(data)
+        if errors and len(errors) == len(results):
+            _raise_update_failed("station", errors)
+
+        await self._async_write_journal(fresh)
+        integrated = self._integrate(fresh)
+        if self.data is not None:
+            self._changed_fields = _changed_fields(self.data, data)
+            self._changed_fields.update(
+                (station_id, INTEGRATED_CONTEXT) for station_id in integrated
+            )
+            # 过期电站每次都要刷新数据年龄和可用性
+            self._changed_fields.update(
+                (station_id, key)
+                for station_id in was_stale | self.stale_stations
+                for key in (*SNAPSHOT_FIELDS, *self.schema.get(station_id, ()), INTEGRATED_CONTEXT)
+            )
+        self._schedule_next_poll(data)
+        return data
+
+    async def async_shutdown(self) -> None:
+        """Cancel the staleness check along with the scheduled refresh."""
+        await super().async_shutdown()
+        self._cancel_staleness_check()
+
+    @callback
+    def _schedule_staleness_check(self, data: dict[str, StationSnapshot]) -> None:
+        """Re-check availability when the next stale station runs out of time.
+
+        Home Assistant does not call the listeners after consecutive failed
+        refreshes, so entities would otherwise stay available for the whole
+        outage.
+        """
+        self._cancel_staleness_check()
+        now = time.time()
+        deadlines = [
+            snapshot.fetched_at + self.max_staleness
+            for station_id, snapshot in data.items()
+            if station_id in self.stale_stations
+            and snapshot.fetched_at + self.max_staleness > now
+        ]
+        if deadlines:
+            # 多等一秒，避免事件循环时钟与 time.time() 的偏差导致提前触发
+            self._unsub_staleness = async_call_later(
+                self.hass, min(deadlines) - now + 1, self._async_staleness_expired
+            )
+
+    @callback
+    def _cancel_staleness_check(self) -> None:
+        if self._unsub_staleness is not None:
+            self._unsub_staleness()
+            self._unsub_staleness = None
+
+    @callback
+    def _async_staleness_expired(self, _now: Any) -> None:
+        self._unsub_staleness = None
+        self._changed_fields = None
+        self.async_update_listeners()
+        self._schedule_staleness_check(self.data or {})
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Call back only the entities whose field changed in the last update."""
+        changed, self._changed_fields = self._changed_fields, None
+        success_changed = self.last_update_success != self._notified_success
+        self._notified_success = self.last_update_success
+        if changed is None or success_changed or not self.last_update_success:
+            super().async_update_listeners()
+            return
+
+        for update_callback, context in list(self._listeners.values()):
+            if context is None or context in changed:
+                update_callback()
+
+    def _snapshot(
+        self, station_id: str, payload: dict[str, Any], fetched_at: float | None = None
+    ) -> StationSnapshot:
+        if self.schema_store is None:
+            return StationSnapshot.from_payload(station_id, payload, fetched_at)
+        keys = frozenset(payload)
+        if keys != self._payload_keys.get(station_id):
+            self._update_schema(station_id, payload, keys)
+        return StationSnapshot.from_payload(
+            station_id, payload, fetched_at, extra_keys=self.schema.get(station_id, ())
+        )
+
+    def _update_schema(
+        self, station_id: str, payload: dict[str, Any], keys: frozenset[str]
+    ) -> None:
+        """Inspect a payload whose shape changed and announce the difference."""
+        old = self.schema.get(station_id, ())
+        new = tuple(discover_numeric_fields(payload))
+        self.schema[station_id] = new
+        self._payload_keys[station_id] = keys
+        self.schema_store.async_delay_save(self._schema_data, SCHEMA_SAVE_DELAY)
+
+        added = [key for key in new if key not in old]
+        removed = [key for key in old if key not in new]
+        if not added and not removed:
+            return
+        _LOGGER.info(
+            "Station %s fields changed: added %s, removed %s", station_id, added, removed
+        )
+        for listener in list(self._schema_listeners):
+            listener(station_id, added, removed)
+
+    def _schema_data(self) -> dict[str, Any]:
+        return {
+            "stations": {
+                station_id: {
+                    "fields": list(fields),
+                    "keys": sorted(self._payload_keys.get(station_id, ())),
+                }
+                for station_id, fields in self.schema.items()
+            }
+        }
+
+    async def _async_write_journal(self, fresh: dict[str, StationSnapshot]) -> None:
+        if self.journal is None or not fresh:
+            return
+        try:
+            await self.hass.async_add_executor_job(self.journal.append, list(fresh.values()))
+        except OSError as err:
+            _LOGGER.warning("Could not write snapshot journal: %s", err)
+
+    def _integrate(self, data: dict[str, StationSnapshot]) -> list[str]:
+        """Feed fresh snapshots to their integrators; return the stations that changed."""
+        integrated = []
+        for station_id, snapshot in data.items():
+            if (integrator := self.integrators.get(station_id)) is None:
+                continue
+            if integrator.add(
+                snapshot.fetched_at,
+                snapshot.real_power,
+                _local_day_start(snapshot.fetched_at),
+                snapshot.day_generation,
+            ):
+                integrated.append(station_id)
+        return integrated
+
+    def _schedule_next_poll(self, data: dict[str, StationSnapshot]) -> None:
+        """Adapt the poll interval to daylight and how fast power is changing."""
+        power = _total_power(data)
+        elevation = rising = None
+        if (sun := self.hass.states.get(SUN_ENTITY_ID)) is not None:
+            elevation = sun.attributes.get("elevation")
+            rising = sun.attributes.get("rising")
+
+        seconds = self.scheduler.next_interval(power, elevation, rising)
+        self.update_interval = timedelta(seconds=seconds)
+        _LOGGER.debug(
+            "Next poll in %.0fs (power=%s, sun elevation=%s)", seconds, power, elevation
+        )
+
+
+class KstarInverterCoordinator(DataUpdateCoordinator[dict[str, InverterSnapshot]]):
+    """Poll inverter details on a slower cadence than the stations.
+
+    Only inverters with an enabled entity are fetched: each entity registers
+    a ``(inverter_id, field)`` context when added to Home Assistant, and the
+    update reads the ids from the registered contexts. With no listeners the
+    coordinator does not poll at all.
+    """
+
+    def __init__(self, hass: HomeAssistant, api: KstarSolarAPI) -> None:
+        """Initialize the coordinator."""
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN}_inverters",
+            update_interval=INVERTER_SCAN_INTERVAL,
+            # 实体陆续加入时等它们都注册完再请求
+            request_refresh_debouncer=Debouncer(
+                hass, _LOGGER, cooldown=INVERTER_REFRESH_COOLDOWN, immediate=False
+            ),
+        )
+        self.api = api
+        self.inverters: dict[str, InverterInfo] = {}
+        self.listed_stations: set[str] = set()
+        # station_id -> (下次重试的 time.monotonic(), 当前退避秒数)
+        self._discovery_backoff: dict[str, tuple[float, float]] = {}
+
+    async def async_discover(self, station_ids: list[str]) -> list[InverterInfo]:
+        """List the inverters of stations not listed yet; return the new ones.
+
+        Stations that fail with a retryable error stay unlisted and are tried
+        again on a later call once their backoff has passed. Any other error
+        means the station has no inverter list, so it counts as listed.
+        """
+        now = time.monotonic()
+        station_ids = [
+            station_id
+            for station_id in station_ids
+            if station_id not in self.listed_stations
+            and self._discovery_backoff.get(station_id, (0.0, 0.0))[0] <= now
+        ]
+        results = await asyncio.gather(
+            *(self.api.get_inverters(station_id) for station_id in station_ids),
+            return_exceptions=True,
+        )
+        found: list[InverterInfo] = []
+        for station_id, result in zip(station_ids, results):
+            if isinstance(result, KstarError) and result.retryable:
+                backoff = min(
+                    self._discovery_backoff.get(station_id, (0.0, 0.0))[1] * 2
+                    or INVERTER_DISCOVERY_BASE_BACKOFF,
+                    INVERTER_DISCOVERY_MAX_BACKOFF,
+                )
+                self._discovery_backoff[station_id] = (now + backoff, backoff)
+                _LOGGER.info(
+                    "Could not list inverters of station %s, retrying in %ds: %s",
+                    station_id,
+                    backoff,
+                    result,
+                )
+                continue
+            self.listed_stations.add(station_id)
+            self._discovery_backoff.pop(station_id, None)
+            if isinstance(result, Exception):
+                _LOGGER.info("Station %s has no inverter list: %s", station_id, result)
+                continue
+            found.extend(result)
+        self.inverters.update((info.inverter_id, info) for info in found)
+        return found
+
+    @property
+    def wanted_inverters(self) -> set[str]:
+        """Ids of inverters that have at least one enabled entity."""
+        return {
+            context[0] for _, context in self._listeners.values() if context is not None
+        }
+
+    async def _async_update_data(self) -> dict[str, InverterSnapshot]:
+        """Fetch the wanted inverters, keeping the previous data for any that fail."""
+        wanted = sorted(self.wanted_inverters)
+        if not wanted:
+            return {}
+        results = await asyncio.gather(
+            *(self.api.get_inverter_data(inverter_id) for inverter_id in wanted),
+            return_exceptions=True,
+        )
+        previous = self.data or {}
+        data: dict[str, InverterSnapshot] = {}
+        errors: list[Exception] = []
+        for inverter_id, result in zip(wanted, results):
+            if isinstance(result, Exception):
+                errors.append(result)
+                _LOGGER.warning("Failed to update inverter %s: %s", inverter_id, result)
+                if inverter_id in previous:
+                    data[inverter_id] = previous[inverter_id]
+                continue
+            data[inverter_id] = InverterSnapshot.from_payload(inverter_id, result)
+
+        if len(errors) == len(wanted):
+            _raise_update_failed("inverter", errors)
+        return data
+
+
+def _raise_update_failed(kind: str, errors: list[Exception]) -> None:
+    """Raise for a poll in which every request failed.
+
+    Rejected credentials start re-authentication instead of being retried.
+    """
+    for err in errors:
+        if isinstance(err, KstarAuthError):
+            raise ConfigEntryAuthFailed(str(err)) from err
+    raise UpdateFailed(f"Failed to get {kind} data: {errors[0]}") from errors[0]
+
+
+def _changed_fields(
+    old: dict[str, StationSnapshot], new: dict[str, StationSnapshot]
+) -> set[tuple[str, str]]:
+    """Return the (station_id, field) pairs that differ between two updates."""
+    changed: set[tuple[str, str]] = set()
+    for station_id in old.keys() | new.keys():
+        old_station = old.get(station_id)
+        new_station = new.get(station_id)
+        if old_station is new_station:
+            continue
+        if old_station is None or new_station is None:
+            changed.update((station_id, key) for key in SNAPSHOT_FIELDS)
+            for station in (old_station, new_station):
+                if station is not None:
+                    changed.update((station_id, key) for key in station.extra)
+            continue
+        for key, attr in SNAPSHOT_FIELDS.items():
+            if getattr(old_station, attr) != getattr(new_station, attr):
+                changed.add((station_id, key))
+        if old_station.extra or new_station.extra:
+            for key in old_station.extra.keys() | new_station.extra.keys():
+                if old_station.extra.get(key) != new_station.extra.get(key):
+                    changed.add((station_id, key))
+    return changed
+
+
+def _local_day_start(timestamp: float) -> float:
+    """Return the timestamp of local midnight on the day of ``timestamp``."""
+    local = dt_util.as_local(dt_util.utc_from_timestamp(timestamp))
+    return dt_util.start_of_local_day(local).timestamp()
+
+
+def _total_power(data: dict[str, StationSnapshot]) -> float | None:
+    """Sum realPower over all stations that reported it."""
+    powers = [s.real_power for s in data.values() if s.real_power is not None]
+    return sum(powers) if powers else None
@@ -0,0 +1,46 @@
+"""Diagnostics support for Kstar Solar Inverter."""
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .coordinator import KstarSolarCoordinator
+
+TO_REDACT = {"username", "password", "access_token", "refresh_token"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator: KstarSolarCoordinator = hass.data[DOMAIN][entry.entry_id]
+    api = coordinator.api
+
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "last_exception": repr(coordinator.last_exception),
+            "stale_stations": sorted(coordinator.stale_stations),
+            "update_interval": (
+                coordinator.update_interval.total_seconds()
+                if coordinator.update_interval
+                else None
+            ),
+        },
+        "client": {
+            "host": api.host,
+            "token_expires_at": api.token_expires_at,
+            "circuit_breaker_open": api.circuit_breaker_open,
+        },
+        "stats": api.stats.as_dict(),
+        "stations": {
+            station_id: asdict(snapshot)
+            for station_id, snapshot in (coordinator.data or {}).items()
+        },
+    }
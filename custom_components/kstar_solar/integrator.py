@@ -0,0 +1,177 @@
+"""Local energy and power statistics derived from realPower samples."""
+from __future__ import annotations
+
+from collections import deque
+
+from .const import INTEGRATION_BUFFER_SIZE, INTEGRATION_MAX_GAP, INTEGRATION_WINDOW
+
+
+class PowerIntegrator:
+    """Integrate one station's realPower samples as they arrive.
+
+    Samples live in a bounded ring buffer of ``(timestamp, W, Wh, seconds)``
+    where the last two describe the trapezoid ending at that sample. The
+    rolling window keeps running sums and a monotonic deque for the peak,
+    so every update costs O(1) amortized.
+
+    The day estimate follows the cloud: whenever ``dayGeneration`` changes
+    it becomes the new base and only the energy integrated since then is
+    added on top.
+    """
+
+    __slots__ = (
+        "window",
+        "max_gap",
+        "capacity",
+        "_samples",
+        "_peaks",
+        "_window_wh",
+        "_window_seconds",
+        "_day_start",
+        "_day_wh",
+        "_cloud_kwh",
+        "_since_cloud_wh",
+        "_last_cloud",
+        "_last_timestamp",
+        "drift_kwh",
+    )
+
+    def __init__(
+        self,
+        capacity: float | None = None,
+        window: float = INTEGRATION_WINDOW,
+        max_gap: float = INTEGRATION_MAX_GAP,
+        size: int = INTEGRATION_BUFFER_SIZE,
+    ) -> None:
+        self.window = window
+        self.max_gap = max_gap
+        self.capacity = capacity  # kWp
+        self._samples: deque[tuple[float, float, float, float]] = deque(maxlen=size)
+        self._peaks: deque[tuple[float, float]] = deque()
+        self._window_wh = 0.0
+        self._window_seconds = 0.0
+        self._day_start: float | None = None
+        self._day_wh = 0.0
+        self._cloud_kwh: float | None = None
+        self._since_cloud_wh = 0.0
+        self._last_cloud: float | None = None
+        self._last_timestamp: float | None = None
+        # 最近一次对齐时本地积分与云端日发电量的差（kWh）
+        self.drift_kwh: float | None = None
+
+    def add(
+        self,
+        timestamp: float,
+        power: float | None,
+        day_start: float,
+        day_generation: float | None = None,
+    ) -> bool:
+        """Add a sample and return True if it was used.
+
+        ``timestamp`` must be when the cloud data was actually fetched; a
+        sample no newer than the previous one (e.g. the same cached payload
+        again) is ignored. ``day_start`` is the timestamp of local midnight
+        for the sample, so the day total resets without this module knowing
+        about time zones.
+        """
+        if self._last_timestamp is not None and timestamp <= self._last_timestamp:
+            return False
+        self._last_timestamp = timestamp
+        if day_start != self._day_start:
+            self._start_day(day_start)
+
+        used = False
+        if power is not None:
+            self._add_power(timestamp, power)
+            used = True
+
+        # 云端数值变化时才对齐；跨天后仍返回昨天的数值会被忽略
+        if day_generation is not None and day_generation != self._last_cloud:
+            self._last_cloud = day_generation
+            if self._cloud_kwh is not None or self._day_wh:
+                self.drift_kwh = round(self.day_energy - day_generation, 3)
+            self._cloud_kwh = day_generation
+            self._since_cloud_wh = 0.0
+            used = True
+        return used
+
+    def _start_day(self, day_start: float) -> None:
+        self._day_start = day_start
+        self._day_wh = 0.0
+        self._cloud_kwh = None
+        self._since_cloud_wh = 0.0
+        self.drift_kwh = None
+
+    def _add_power(self, timestamp: float, power: float) -> None:
+        energy_wh = seconds = day_wh = 0.0
+        if self._samples:
+            last_ts, last_power = self._samples[-1][:2]
+            gap = timestamp - last_ts
+            if gap <= self.max_gap:
+                seconds = gap
+                energy_wh = day_wh = (last_power + power) / 2 * seconds / 3600
+                if self._day_start is not None and last_ts < self._day_start:
+                    # 跨零点的一段只计入当天的部分
+                    day_wh = energy_wh * (timestamp - self._day_start) / gap
+
+        if len(self._samples) == self._samples.maxlen:
+            self._evict()
+        self._samples.append((timestamp, power, energy_wh, seconds))
+        self._day_wh += day_wh
+        self._since_cloud_wh += day_wh
+        self._window_wh += energy_wh
+        self._window_seconds += seconds
+
+        while self._peaks and self._peaks[-1][1] <= power:
+            self._peaks.pop()
+        self._peaks.append((timestamp, power))
+
+        cutoff = timestamp - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._evict()
+        while self._peaks[0][0] < cutoff:
+            self._peaks.popleft()
+
+    def _evict(self) -> None:
+        _, _, energy_wh, seconds = self._samples.popleft()
+        self._window_wh -= energy_wh
+        self._window_seconds -= seconds
+        if self._window_seconds <= 0:
+            self._window_wh = self._window_seconds = 0.0
+
+    @property
+    def day_start(self) -> float | None:
+        """Timestamp of the local midnight that day_energy counts from."""
+        return self._day_start
+
+    @property
+    def day_energy(self) -> float:
+        """Today's energy estimate in kWh."""
+        if self._cloud_kwh is None:
+            return self._day_wh / 1000
+        return self._cloud_kwh + self._since_cloud_wh / 1000
+
+    @property
+    def peak_power(self) -> float | None:
+        """Highest realPower in the rolling window, in W."""
+        return self._peaks[0][1] if self._peaks else None
+
+    @property
+    def average_power(self) -> float | None:
+        """Time-weighted mean power over the rolling window, in W."""
+        if self._window_seconds <= 0:
+            return self._samples[-1][1] if self._samples else None
+        return self._window_wh * 3600 / self._window_seconds
+
+    def capacity_factor(self, now: float) -> float | None:
+        """Today's energy over what the rated capacity could make since midnight, in %."""
+        if not self.capacity or self._day_start is None:
+            return None
+        hours = (now - self._day_start) / 3600
+        if hours <= 0:
+            return None
+        return self.day_energy / (self.capacity * hours) * 100
+
+    @property
+    def sample_count(self) -> int:
+        return len(self._samples)
@@ -0,0 +1,117 @@
+"""Append-only on-disk journal of station snapshots."""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from .const import JOURNAL_BACKUPS, JOURNAL_MAX_BYTES
+from .models import SNAPSHOT_FIELDS, StationSnapshot
+
+_LOGGER = logging.getLogger(__name__)
+
+JOURNAL_VERSION = 1
+_ATTRS = tuple(SNAPSHOT_FIELDS.values())
+
+
+class SnapshotJournal:
+    """One JSON line per poll, rotated once the file reaches ``max_bytes``.
+
+    A line is ``{"v": 1, "s": {station_id: [fetched_at, value, ...]}}`` with
+    values in ``SNAPSHOT_FIELDS`` order, followed by a mapping of discovered
+    fields when there are any. All methods do blocking file I/O and
+    are meant to run in an executor.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        max_bytes: int = JOURNAL_MAX_BYTES,
+        backups: int = JOURNAL_BACKUPS,
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def append(self, snapshots: Iterable[StationSnapshot]) -> None:
+        """Write one line holding the given snapshots."""
+        stations = {snapshot.station_id: _to_row(snapshot) for snapshot in snapshots}
+        if not stations:
+            return
+        line = json.dumps(
+            {"v": JOURNAL_VERSION, "s": stations}, separators=(",", ":")
+        ).encode() + b"\n"
+
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        if size and size + len(line) > self.max_bytes:
+            self._rotate()
+        with self.path.open("ab") as file:
+            file.write(line)
+
+    def load_latest(self) -> dict[str, StationSnapshot]:
+        """Return the most recent snapshot of every station in the journal."""
+        latest: dict[str, StationSnapshot] = {}
+        # 从最旧的备份读到当前文件，后面的记录覆盖前面的
+        for path in reversed(self._paths()):
+            try:
+                lines = path.read_bytes().splitlines()
+            except FileNotFoundError:
+                continue
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                    if record.get("v") != JOURNAL_VERSION:
+                        continue
+                    for station_id, row in record["s"].items():
+                        latest[station_id] = _from_row(station_id, row)
+                except (ValueError, TypeError, KeyError, AttributeError):
+                    # 写入中途断电会留下半行，跳过即可
+                    _LOGGER.debug("Skipping unreadable journal line in %s", path)
+        return latest
+
+    def remove(self) -> None:
+        """Delete the journal and its backups."""
+        for path in self._paths():
+            path.unlink(missing_ok=True)
+
+    def _paths(self) -> list[Path]:
+        return [self.path] + [
+            self.path.with_name(f"{self.path.name}.{index}")
+            for index in range(1, self.backups + 1)
+        ]
+
+    def _rotate(self) -> None:
+        paths = self._paths()
+        if len(paths) == 1:
+            self.path.unlink(missing_ok=True)
+            return
+        for older, newer in zip(reversed(paths[1:]), reversed(paths[:-1])):
+            if newer.exists():
+                os.replace(newer, older)
+
+
+def _to_row(snapshot: StationSnapshot) -> list[Any]:
+    row: list[Any] = [snapshot.fetched_at, *(getattr(snapshot, attr) for attr in _ATTRS)]
+    if snapshot.extra:
+        row.append(dict(snapshot.extra))
+    return row
+
+
+def _from_row(station_id: str, row: list[Any]) -> StationSnapshot:
+    fetched_at, *values = row
+    extra = values.pop() if values and isinstance(values[-1], dict) else {}
+    if len(values) != len(_ATTRS):
+        raise ValueError(f"Expected {len(_ATTRS)} values, got {len(values)}")
+    return StationSnapshot(
+        station_id=station_id,
+        fetched_at=float(fetched_at),
+        extra=extra,
+        **dict(zip(_ATTRS, values)),
+    )
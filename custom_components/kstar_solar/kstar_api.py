@@ -1,23 +1,320 @@
 """API client for Kstar Solar Inverter."""
+import asyncio
 import logging
 import base64
-from typing import Any, Dict
+import json
+import random
+import time
+from datetime import date, timedelta
+from email.utils import parsedate_to_datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 import aiohttp
-from .const import LOGIN_URL, STATION_DETAIL_URL
+
+try:
+    import orjson
+except ImportError:  # orjson 随 Home Assistant 安装，独立使用时可能没有
+    orjson = None
+
+from .const import (
+    BREAKER_BASE_BACKOFF,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_MAX_BACKOFF,
+    CONNECTION_LIMIT_PER_HOST,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_RETRY_BUDGET,
+    DEFAULT_TIMEOUT,
+    DNS_CACHE_TTL,
+    KEEPALIVE_TIMEOUT,
+    INVERTER_DETAIL_URL,
+    INVERTER_LIST_URL,
+    LOGIN_URL,
+    MAX_RESPONSE_BYTES,
+    RETRY_AFTER_MAX,
+    RETRY_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    STATION_DAY_CURVE_URL,
+    STATION_DETAIL_URL,
+    STATION_MONTH_GENERATION_URL,
+    TOKEN_EXPIRY_GRACE,
+    TOKEN_REFRESH_MARGIN,
+)
+from .models import (
+    SNAPSHOT_FIELDS,
+    HistoryDay,
+    InverterInfo,
+    parse_inverter_list,
+    parse_month_generation,
+    parse_power_curve,
+)
+from .stats import ClientStats
 
 _LOGGER = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
+JsonLoads = Callable[[Union[bytes, str]], Any]
+
+# 默认解码器：有 orjson 时使用，否则用标准库
+default_loads: JsonLoads = orjson.loads if orjson is not None else json.loads
+
+
+class KstarError(Exception):
+    """Base class for errors raised by the Kstar API client."""
+
+    category = "other"
+    # 可重试的错误在重试预算内按退避重试，其余错误立即抛出
+    retryable = False
+
+
+class KstarConnectionError(KstarError):
+    """Error to indicate the Kstar cloud could not be reached."""
+
+    category = "connection"
+    retryable = True
+
+
+class KstarRateLimitError(KstarConnectionError):
+    """Error to indicate the Kstar cloud asked us to slow down."""
+
+    category = "rate_limited"
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class KstarApiError(KstarError):
+    """Error to indicate the Kstar cloud answered with an error code."""
+
+    category = "api_error"
+
+
+class KstarAuthError(KstarError):
+    """Error to indicate the credentials or tokens were rejected."""
+
+    category = "auth"
+
+
+def create_session(limit_per_host: int = CONNECTION_LIMIT_PER_HOST) -> aiohttp.ClientSession:
+    """Create a keep-alive session suitable for sharing between API clients.
+
+    Auth headers are sent per request, so one session can serve any number of
+    clients and survives token refreshes.
+    """
+    connector = aiohttp.TCPConnector(
+        ssl=False,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+def parse_station_ids(value: str) -> List[str]:
+    """Split a comma separated station id field into unique ids, keeping order."""
+    station_ids: List[str] = []
+    for part in value.replace("，", ",").split(","):
+        station_id = part.strip()
+        if station_id and station_id not in station_ids:
+            station_ids.append(station_id)
+    return station_ids
+
+
+def _parse_expires_in(token_data: Dict[str, Any]) -> Optional[float]:
+    """Read the token lifetime in seconds from a login or refresh response."""
+    for key in ("expires_in", "expiresIn"):
+        value = token_data.get(key)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Read a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), RETRY_AFTER_MAX)
+
+
+def _raise_for_status(response: aiohttp.ClientResponse) -> None:
+    """Raise the ``KstarError`` matching an HTTP error status."""
+    status = response.status
+    if status < 400:
+        return
+    retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+    if status == 429 or (status == 503 and retry_after is not None):
+        raise KstarRateLimitError(f"Rate limited (HTTP {status})", retry_after)
+
+    error = aiohttp.ClientResponseError(
+        response.request_info,
+        response.history,
+        status=status,
+        message=response.reason or "",
+        headers=response.headers,
+    )
+    if status == 401:
+        raise KstarAuthError(f"Unauthorized (HTTP {status})") from error
+    if status >= 500:
+        raise KstarConnectionError(f"Server error (HTTP {status})") from error
+    raise KstarApiError(f"Request rejected (HTTP {status})") from error
+
+
+def _retry_delay(err: KstarError, attempt: int) -> float:
+    """Return how long to wait before retry number ``attempt + 1``."""
+    if isinstance(err, KstarRateLimitError) and err.retry_after is not None:
+        return err.retry_after
+    # 一半固定、一半随机，避免多个客户端同时重试
+    backoff = min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY)
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+class _RateLimiter:
+    """Space requests out to at most ``rate`` per second."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next_slot = 0.0
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        delay = self._next_slot - now
+        if self.rate > 0:
+            self._next_slot = max(now, self._next_slot) + 1 / self.rate
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request for ``seconds``, e.g. after a Retry-After."""
+        resume = asyncio.get_running_loop().time() + seconds
+        self._next_slot = max(self._next_slot, resume)
+
+
+class _CircuitBreaker:
+    """Stop calling the cloud after repeated failures, backing off exponentially."""
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        base_backoff: float = BREAKER_BASE_BACKOFF,
+        max_backoff: float = BREAKER_MAX_BACKOFF,
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self._trips = 0
+        self._open_until = 0.0
+        self._failed_batch: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def record_success(self) -> None:
+        if self._trips:
+            _LOGGER.info("Kstar cloud reachable again, closing circuit breaker")
+        self.failures = 0
+        self._trips = 0
+        self._open_until = 0.0
+
+    def record_failure(self, batch: Optional[float] = None) -> None:
+        """Count a failure; failures sharing the same ``batch`` key count once."""
+        if self.is_open:
+            # 熔断期间的失败不再累计
+            return
+        if batch is not None:
+            if batch == self._failed_batch:
+                # 同一批并发请求的失败只算一次
+                return
+            self._failed_batch = batch
+        self.failures += 1
+        if self.failures < self.failure_threshold:
+            return
+        backoff = min(self.base_backoff * 2 ** self._trips, self.max_backoff)
+        self._trips += 1
+        self._open_until = time.monotonic() + backoff
+        _LOGGER.warning(
+            "Kstar cloud failed %d times in a row, pausing requests for %ds",
+            self.failures,
+            backoff,
+        )
+
 
 class KstarSolarAPI:
-    def __init__(self, host: str, station_id: str, username: str, password: str, timeout: int = 30):
+    def __init__(
+        self,
+        host: str,
+        station_id: str,
+        username: str,
+        password: str,
+        timeout: float = DEFAULT_TIMEOUT,
+        session: Optional[aiohttp.ClientSession] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        rate_limit: float = DEFAULT_RATE_LIMIT,
+        loads: Optional[JsonLoads] = None,
+        max_response_bytes: int = MAX_RESPONSE_BYTES,
+        retry_budget: float = DEFAULT_RETRY_BUDGET,
+        cache_ttl: float = 0,
+    ):
         self.host = host.rstrip("/")
         self.station_id = station_id
         self.username = username
         self.password = password
         self.access_token = None
         self.refresh_token = None
-        self.timeout = aiohttp.ClientTimeout(total=timeout)
-        self.session = None
+        self.token_expires_at: Optional[float] = None
+        self._token_listener: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._background_refresh: Optional[asyncio.Task] = None
+        self.set_timeout(timeout)
+        self.session = session
+        # 外部传入的 session 由集成统一管理，不在这里关闭
+        self._owns_session = session is None
+        self._loads = loads or default_loads
+        # 字段发现模式需要完整的电站数据
+        self.keep_all_fields = False
+        self.max_response_bytes = max_response_bytes
+        self.retry_budget = retry_budget
+        self.cache_ttl = cache_ttl
+        # 登录被拒后不再用同一组凭据重试，避免账号被锁
+        self._login_rejected: Optional[str] = None
+        self._max_concurrency = 0
+        self._semaphore = asyncio.Semaphore()
+        self._rate_limiter = _RateLimiter(rate_limit)
+        self.set_concurrency(max_concurrency, rate_limit)
+        # 同一账号下所有电站共用一次登录
+        self._token_lock = asyncio.Lock()
+        # 同一电站的并发请求合并为一次
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._breaker = _CircuitBreaker()
+        self._last_good: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at: Dict[str, float] = {}  # time.monotonic()
+        self.stats = ClientStats()
         self._headers = {
             "Accept": "application/json, text/plain, */*",
             "Accept-Language": "zh-CN,zh;q=0.9",
@@ -27,66 +324,96 @@ class KstarSolarAPI:
         }
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Get or create aiohttp session."""
+        """Get the shared session, or create a private one if none was given."""
         if self.session is None or self.session.closed:
-            connector = aiohttp.TCPConnector(verify_ssl=False)
-            self.session = aiohttp.ClientSession(
-                timeout=self.timeout,
-                connector=connector,
-                headers=self._headers
-            )
+            self.session = create_session()
+            self._owns_session = True
         return self.session
 
+    def set_concurrency(self, max_concurrency: int, rate_limit: float) -> None:
+        """Set how many station requests may run at once and how fast they start."""
+        max_concurrency = max(1, max_concurrency)
+        if max_concurrency != self._max_concurrency:
+            self._max_concurrency = max_concurrency
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+        # 原地修改速率，保留正在生效的 Retry-After 暂停
+        self._rate_limiter.rate = rate_limit
+
+    def set_timeout(self, timeout: float) -> None:
+        """Set the total timeout of each request in seconds."""
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def use_session(self, session: aiohttp.ClientSession) -> None:
+        """Switch to a session managed by the caller, closing any private one."""
+        if self._owns_session and self.session and self.session is not session:
+            await self.session.close()
+        self.session = session
+        self._owns_session = False
+
     async def _login(self) -> None:
-        """Login with username and encrypted password to get tokens."""
+        """Login with username and encrypted password to get tokens.
+
+        Once the cloud rejects the credentials, later calls raise
+        ``KstarAuthError`` without contacting it again.
+        """
+        if self._login_rejected is not None:
+            raise KstarAuthError(self._login_rejected)
+
+        _LOGGER.info("Logging in with username/password")
+        basic_auth = base64.b64encode(b"kstar:kstarSecret").decode("utf-8")
+        headers = {
+            **self._headers,
+            "Authorization": f"Basic {basic_auth}",
+            "Origin": self.host,
+            "Referer": f"{self.host}/",
+        }
+
+        form_data = aiohttp.FormData()
+        form_data.add_field("username", self.username)
+        form_data.add_field("password", self.password)
+
+        self.stats.increment("logins")
         try:
-            _LOGGER.info("Logging in with username/password")
-            session = await self._get_session()
-
-            basic_auth = base64.b64encode(b"kstar:kstarSecret").decode("utf-8")
-            headers = {
-                **self._headers,
-                "Authorization": f"Basic {basic_auth}",
-                "Origin": self.host,
-                "Referer": f"{self.host}/",
-            }
-
-            form_data = aiohttp.FormData()
-            form_data.add_field("username", self.username)
-            form_data.add_field("password", self.password)
-
-            async with session.post(
-                f"{self.host}{LOGIN_URL}",
-                data=form_data,
-                headers=headers,
-            ) as response:
-                response.raise_for_status()
-                data = await response.json()
-                _LOGGER.debug("Login response: %s", data)
-
-                token_data = data.get("token", {})
-                access_token = token_data.get("access_token")
-                if not access_token:
-                    error_msg = data.get("message", "No access_token in response")
-                    _LOGGER.error("Login failed: %s", error_msg)
-                    raise Exception(f"Login failed: {error_msg}")
-
-                self.access_token = access_token
-                self.refresh_token = token_data.get("refresh_token")
-                self._headers["Authorization"] = f"bearer {self.access_token}"
-                _LOGGER.info("Login successful")
-
-        except Exception as e:
+            with self.stats.timed("login"):
+                data = await self._request_json("POST", LOGIN_URL, headers, data=form_data)
+            _LOGGER.debug("Login response code: %s", data.get("code"))
+
+            token_data = data.get("token") or {}
+            access_token = token_data.get("access_token")
+            if not access_token:
+                error_msg = data.get("message", "No access_token in response")
+                code = data.get("code")
+                if isinstance(code, int) and code >= 500:
+                    # 云端自身出错，不代表密码错误
+                    raise KstarConnectionError(f"Login failed: {error_msg}")
+                raise KstarAuthError(f"Login failed: {error_msg}")
+        except KstarError as e:
             _LOGGER.error("Login error: %s", e)
+            self.stats.record_error(e)
+            if isinstance(e, KstarAuthError):
+                self._login_rejected = str(e)
             raise
 
-    async def _refresh_access_token(self) -> None:
+        self._set_tokens(
+            access_token,
+            token_data.get("refresh_token"),
+            _parse_expires_in(token_data),
+        )
+        _LOGGER.info("Login successful")
+
+    async def _refresh_access_token(self, stale_token: Optional[str] = None) -> None:
+        """Refresh the token once for all callers that saw ``stale_token`` rejected."""
+        async with self._token_lock:
+            if stale_token is not None and self.access_token != stale_token:
+                # 其他请求已经完成了刷新
+                return
+            await self._do_refresh_access_token()
+
+    async def _do_refresh_access_token(self) -> None:
         """Refresh access_token using refresh_token, fallback to login."""
         if self.refresh_token:
             try:
                 _LOGGER.info("Refreshing access token via refresh_token")
-                session = await self._get_session()
-
                 basic_auth = base64.b64encode(b"kstar:kstarSecret").decode("utf-8")
                 headers = {
                     **self._headers,
@@ -101,93 +428,381 @@ class KstarSolarAPI:
                     "refresh_token": self.refresh_token,
                 }
 
-                async with session.post(
-                    f"{self.host}/prod-api/oauth/token",
-                    data=refresh_data,
-                    headers=headers,
-                ) as response:
-                    response.raise_for_status()
-                    data = await response.json()
-                    _LOGGER.debug("Token refresh response: %s", data)
-
-                    if "value" in data:
-                        self.access_token = data["value"]
-                        if "refreshToken" in data and "value" in data["refreshToken"]:
-                            self.refresh_token = data["refreshToken"]["value"]
-                        self._headers["Authorization"] = f"bearer {self.access_token}"
-                        _LOGGER.info("Token refreshed successfully")
-                        return
-                    else:
-                        _LOGGER.warning("Token refresh returned no value, falling back to login")
-            except Exception as e:
+                self.stats.increment("refreshes")
+                with self.stats.timed("refresh"):
+                    data = await self._request_json(
+                        "POST", "/prod-api/oauth/token", headers, data=refresh_data
+                    )
+
+                if "value" in data:
+                    refresh_token = self.refresh_token
+                    if "refreshToken" in data and "value" in data["refreshToken"]:
+                        refresh_token = data["refreshToken"]["value"]
+                    self._set_tokens(data["value"], refresh_token, _parse_expires_in(data))
+                    _LOGGER.info("Token refreshed successfully")
+                    return
+                else:
+                    _LOGGER.warning("Token refresh returned no value, falling back to login")
+            except KstarError as e:
                 _LOGGER.warning("Token refresh failed (%s), falling back to login", e)
+                self.stats.record_error(e)
 
         # Fallback: re-login with username/password
         await self._login()
 
     async def _ensure_token(self) -> None:
-        """Ensure we have a valid access_token."""
+        """Ensure we have a valid access_token, refreshing ahead of expiry."""
         if not self.access_token:
-            await self._login()
+            async with self._token_lock:
+                if not self.access_token:
+                    await self._login()
+            return
+
+        if self.token_expires_at is None:
+            return
+
+        remaining = self.token_expires_at - time.time()
+        if remaining <= TOKEN_EXPIRY_GRACE:
+            _LOGGER.debug("Access token expired, refreshing before request")
+            await self._refresh_access_token(self.access_token)
+        elif remaining <= TOKEN_REFRESH_MARGIN and self._background_refresh is None:
+            _LOGGER.debug("Access token expires in %ds, refreshing in background", remaining)
+            self._background_refresh = asyncio.get_running_loop().create_task(
+                self._refresh_in_background(self.access_token)
+            )
+
+    async def _refresh_in_background(self, token: str) -> None:
+        """Refresh the token without blocking the poll that noticed it."""
+        try:
+            await self._refresh_access_token(token)
+        except Exception as e:  # pylint: disable=broad-except
+            _LOGGER.warning("Background token refresh failed: %s", e)
+        finally:
+            self._background_refresh = None
+
+    def _set_tokens(
+        self, access_token: str, refresh_token: Optional[str], expires_in: Optional[float]
+    ) -> None:
+        """Store new tokens and notify the persistence listener."""
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.token_expires_at = time.time() + expires_in if expires_in else None
+        self._headers["Authorization"] = f"bearer {self.access_token}"
+        if self._token_listener is not None:
+            self._token_listener(self.export_tokens())
+
+    def export_tokens(self) -> Dict[str, Any]:
+        """Return the current tokens in a JSON serialisable form."""
+        return {
+            "username": self.username,
+            "access_token": self.access_token,
+            "refresh_token": self.refresh_token,
+            "expires_at": self.token_expires_at,
+        }
+
+    def restore_tokens(self, tokens: Dict[str, Any]) -> bool:
+        """Load tokens saved by a previous run; ignore them if they belong to another user."""
+        if not tokens or tokens.get("username") != self.username:
+            return False
+        if not tokens.get("access_token"):
+            return False
+        self.access_token = tokens["access_token"]
+        self.refresh_token = tokens.get("refresh_token")
+        self.token_expires_at = tokens.get("expires_at")
+        self._headers["Authorization"] = f"bearer {self.access_token}"
+        return True
+
+    def set_token_listener(self, listener: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+        """Register a callback invoked whenever the tokens change."""
+        self._token_listener = listener
+
+    async def get_station_data(
+        self,
+        station_id: Optional[str] = None,
+        max_age: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Get station data from API.
+
+        Concurrent calls for the same station share one in-flight request,
+        and a payload fetched less than ``max_age`` seconds ago (``cache_ttl``
+        by default) is returned without a request. Retries stop at
+        ``deadline`` (``time.monotonic()``), ``retry_budget`` from now by
+        default.
+        """
+        station_id = station_id or self.station_id
+        if max_age is None:
+            max_age = self.cache_ttl
+        age = self.data_age(station_id)
+        if age is not None and age < max_age:
+            self.stats.increment("cache_hits")
+            return self._last_good[station_id]
+
+        task = self._inflight.get(station_id)
+        if task is not None:
+            self.stats.increment("coalesced")
+        else:
+            task = asyncio.get_running_loop().create_task(
+                self._get_station_data(station_id, deadline)
+            )
+            self._inflight[station_id] = task
+
+            def _done(finished: asyncio.Task) -> None:
+                if self._inflight.get(station_id) is finished:
+                    del self._inflight[station_id]
+
+            task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    async def _get_station_data(
+        self, station_id: str, deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Fetch one station behind the circuit breaker."""
+        if self._breaker.is_open:
+            return self._serve_last_good(station_id)
+
+        try:
+            data = await self._with_retries(
+                lambda: self._fetch_station_data(station_id), deadline
+            )
+        except KstarConnectionError as err:
+            self.stats.record_error(err)
+            # 同一批请求共用一个截止时间，以它区分批次
+            self._breaker.record_failure(deadline)
+            if self._breaker.is_open and station_id in self._last_good:
+                return self._serve_last_good(station_id)
+            raise
+        except Exception as err:
+            self.stats.record_error(err)
+            raise
+
+        self._breaker.record_success()
+        self._last_good[station_id] = data
+        self._fetched_at[station_id] = time.monotonic()
+        return data
+
+    def data_age(self, station_id: str) -> Optional[float]:
+        """Seconds since the station's payload was last fetched, if ever."""
+        fetched_at = self._fetched_at.get(station_id)
+        return None if fetched_at is None else time.monotonic() - fetched_at
+
+    @property
+    def circuit_breaker_open(self) -> bool:
+        """Return True while requests to the cloud are paused."""
+        return self._breaker.is_open
+
+    def _serve_last_good(self, station_id: str) -> Dict[str, Any]:
+        """Return the last successful payload while the circuit is open."""
+        if station_id not in self._last_good:
+            raise KstarConnectionError("Kstar cloud unavailable, circuit breaker open")
+        _LOGGER.debug("Circuit breaker open, serving last good data for %s", station_id)
+        self.stats.increment("served_stale")
+        return self._last_good[station_id]
+
+    async def get_stations_data(
+        self, station_ids: Iterable[str], max_age: Optional[float] = None
+    ) -> Dict[str, Union[Dict[str, Any], Exception]]:
+        """Fetch several stations concurrently; the token lock keeps it to one login.
+
+        Failures are returned in place of the station's data so one bad
+        station does not discard the rest of the batch. All stations share
+        one retry deadline, ``retry_budget`` seconds after the call, and
+        requests still queued when the circuit breaker opens are not sent.
+        """
+        station_ids = list(station_ids)
+        deadline = time.monotonic() + self.retry_budget
+        results = await asyncio.gather(
+            *(
+                self.get_station_data(station_id, max_age, deadline)
+                for station_id in station_ids
+            ),
+            return_exceptions=True,
+        )
+        return dict(zip(station_ids, results))
+
+    async def get_day_power_curve(
+        self, day: date, station_id: Optional[str] = None
+    ) -> List[Tuple[int, float]]:
+        """Return one day's power curve as (seconds since midnight, W) samples."""
+        data = await self._get_limited(
+            STATION_DAY_CURVE_URL,
+            {"stationId": station_id or self.station_id, "date": day.isoformat()},
+        )
+        return parse_power_curve(data)
+
+    async def get_month_generation(
+        self, month: date, station_id: Optional[str] = None
+    ) -> Dict[date, float]:
+        """Return kWh generated per day for the month containing ``month``."""
+        data = await self._get_limited(
+            STATION_MONTH_GENERATION_URL,
+            {"stationId": station_id or self.station_id, "month": month.strftime("%Y-%m")},
+        )
+        return parse_month_generation(data)
+
+    async def iter_history(
+        self, start: date, end: date, station_id: Optional[str] = None
+    ) -> AsyncIterator[HistoryDay]:
+        """Yield history one day at a time, fetching each page only when needed."""
+        station_id = station_id or self.station_id
+        month_totals: Dict[date, float] = {}
+        current_month: Optional[date] = None
+        day = start
+        while day <= end:
+            month = day.replace(day=1)
+            if month != current_month:
+                month_totals = await self.get_month_generation(month, station_id)
+                current_month = month
+            curve = await self.get_day_power_curve(day, station_id)
+            yield HistoryDay(station_id, day, month_totals.get(day), tuple(curve))
+            day += timedelta(days=1)
+
+    async def get_inverters(self, station_id: Optional[str] = None) -> List[InverterInfo]:
+        """Return the inverters of a station."""
+        station_id = station_id or self.station_id
+        data = await self._get_limited(INVERTER_LIST_URL, {"stationId": station_id})
+        return parse_inverter_list(station_id, data)
+
+    async def get_inverter_data(self, inverter_id: str) -> Dict[str, Any]:
+        """Return one inverter's detail payload."""
+        return await self._get_limited(INVERTER_DETAIL_URL, {"inverterId": inverter_id})
+
+    async def _get_limited(self, path: str, params: Dict[str, str]) -> Any:
+        """GET an endpoint under the same login, limits and retries as stations."""
 
-    async def get_station_data(self) -> Dict[str, Any]:
-        """Get station data from API."""
+        async def request() -> Any:
+            await self._ensure_token()
+            async with self._semaphore:
+                await self._rate_limiter.acquire()
+                return await self._get_api(path, params)
+
+        return await self._with_retries(request)
+
+    async def _with_retries(
+        self, request: Callable[[], Awaitable[_T]], deadline: Optional[float] = None
+    ) -> _T:
+        """Await ``request()``, retrying retryable errors with jittered backoff.
+
+        Retries stop after ``RETRY_ATTEMPTS``, when the next wait would end
+        past ``deadline`` (``retry_budget`` seconds from now by default), or
+        when the circuit breaker opens.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.retry_budget
+        attempt = 0
+        while True:
+            try:
+                return await request()
+            except KstarError as err:
+                if isinstance(err, KstarRateLimitError) and err.retry_after:
+                    # 其他并发请求也一起等待
+                    self._rate_limiter.pause(err.retry_after)
+                if not err.retryable or attempt >= RETRY_ATTEMPTS or self._breaker.is_open:
+                    raise
+                delay = _retry_delay(err, attempt)
+                if time.monotonic() + delay > deadline:
+                    raise
+                attempt += 1
+                self.stats.increment("retries")
+                self.stats.record_error(err)
+                _LOGGER.debug("Request failed (%s), retry %d in %.1fs", err, attempt, delay)
+                await asyncio.sleep(delay)
+
+    async def _fetch_station_data(self, station_id: str) -> Dict[str, Any]:
+        """Request one station and keep only the fields the sensors read."""
         await self._ensure_token()
+        async with self._semaphore:
+            if self._breaker.is_open:
+                # 排队期间熔断已打开，不再请求云端
+                raise KstarConnectionError("Kstar cloud unavailable, circuit breaker open")
+            await self._rate_limiter.acquire()
+            self.stats.increment("fetches")
+            with self.stats.timed("fetch"):
+                data = await self._get_api(STATION_DETAIL_URL, {"stationId": station_id})
+        if self.keep_all_fields:
+            return data
+        return {key: data[key] for key in SNAPSHOT_FIELDS if key in data}
 
+    async def _get_api(self, path: str, params: Dict[str, str]) -> Any:
+        """GET an API endpoint and return its ``data``, refreshing the token once on 401."""
+        token = self.access_token
         try:
-            session = await self._get_session()
+            return self._parse_response(await self._request_json("GET", path, params=params))
+        except KstarAuthError:
+            _LOGGER.info("Access token rejected, refreshing")
+            self.stats.increment("retries_401")
+            await self._refresh_access_token(token)
+        return self._parse_response(await self._request_json("GET", path, params=params))
 
-            async with session.get(
-                f"{self.host}{STATION_DETAIL_URL}",
-                params={"stationId": self.station_id},
+    async def _request_json(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Send a request and decode its JSON body, raising ``KstarError`` on failure."""
+        session = await self._get_session()
+        try:
+            async with session.request(
+                method,
+                f"{self.host}{path}",
+                headers=headers or self._headers,
+                timeout=self.timeout,
+                **kwargs,
             ) as response:
-                if response.status == 401:
-                    _LOGGER.info("Token expired, refreshing")
-                    await self._refresh_access_token()
-                    await self.close()
-                    session = await self._get_session()
-
-                    async with session.get(
-                        f"{self.host}{STATION_DETAIL_URL}",
-                        params={"stationId": self.station_id},
-                    ) as retry_response:
-                        retry_response.raise_for_status()
-                        return self._parse_response(await retry_response.json())
-                else:
-                    response.raise_for_status()
-                    return self._parse_response(await response.json())
-
+                _raise_for_status(response)
+                return await self._read_json(response)
+        except asyncio.TimeoutError as e:
+            _LOGGER.warning("Request to %s timed out", path)
+            raise KstarConnectionError(f"Request to {path} timed out") from e
         except aiohttp.ClientError as e:
-            _LOGGER.error("Request failed: %s", e)
-            if "401" in str(e):
-                _LOGGER.info("Got 401 error, refreshing token")
-                await self._refresh_access_token()
-                await self.close()
-
-                try:
-                    session = await self._get_session()
-                    async with session.get(
-                        f"{self.host}{STATION_DETAIL_URL}",
-                        params={"stationId": self.station_id},
-                    ) as response:
-                        response.raise_for_status()
-                        return self._parse_response(await response.json())
-                except Exception as retry_error:
-                    _LOGGER.error("Retry after token refresh failed: %s", retry_error)
-                    raise Exception(f"Failed to get station data: {retry_error}")
-            else:
-                raise Exception(f"Failed to get station data: {e}")
-
-    def _parse_response(self, data: dict) -> Dict[str, Any]:
-        """Parse and validate API response."""
-        if data.get("code") != 200:
+            _LOGGER.warning("Request to %s failed: %s", path, e)
+            raise KstarConnectionError(f"Request to {path} failed: {e}") from e
+        except ValueError as e:
+            raise KstarApiError(f"Invalid JSON from {path}") from e
+
+    async def _read_json(self, response: aiohttp.ClientResponse) -> Any:
+        """Read at most ``max_response_bytes`` and decode, timing the decode alone."""
+        body = await self._read_body(response)
+        with self.stats.timed("decode"):
+            return self._loads(body)
+
+    async def _read_body(self, response: aiohttp.ClientResponse) -> bytes:
+        limit = self.max_response_bytes
+        length = response.content_length
+        if length is not None:
+            if length > limit:
+                raise KstarApiError(f"Response of {length} bytes exceeds {limit} bytes")
+            return await response.read()
+
+        # 分块传输时边读边检查，不把超大响应整个读进内存
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(65536):
+            body += chunk
+            if len(body) > limit:
+                raise KstarApiError(f"Response exceeds {limit} bytes")
+        return bytes(body)
+
+    def _parse_response(self, data: Any) -> Any:
+        """Return the ``data`` of a successful envelope."""
+        with self.stats.timed("parse"):
+            if not isinstance(data, dict):
+                raise KstarApiError("Unexpected response body")
+            if data.get("code") == 200:
+                return data.get("data") or {}
             error_msg = data.get("message", "Unknown error")
             _LOGGER.error("API returned error: %s", error_msg)
-            raise Exception(f"Failed to get station data: {error_msg}")
-        return data.get("data", {})
+            raise KstarApiError(f"Failed to get station data: {error_msg}")
 
     async def close(self) -> None:
-        """Close the HTTP session."""
-        if self.session and not self.session.closed:
+        """Close the HTTP session if this client owns it."""
+        if self._background_refresh is not None:
+            self._background_refresh.cancel()
+            self._background_refresh = None
+        for task in list(self._inflight.values()):
+            task.cancel()
+        self._inflight.clear()
+        if self._owns_session and self.session and not self.session.closed:
             await self.session.close()
-            self.session = None
+        self.session = None
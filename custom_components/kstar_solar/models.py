@@ -0,0 +1,346 @@
+"""Parsed station data for Kstar Solar Inverter."""
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any
+
+_LOGGER = logging.getLogger(__name__)
+
+# API 字段名 -> StationSnapshot 属性名
+SNAPSHOT_FIELDS: dict[str, str] = {
+    "realPower": "real_power",
+    "dayGeneration": "day_generation",
+    "monthGeneration": "month_generation",
+    "yearGeneration": "year_generation",
+    "totalGeneration": "total_generation",
+    "dayEarn": "day_earn",
+    "totalEarn": "total_earn",
+    "co2": "co2",
+    "coal": "coal",
+    "forest": "forest",
+}
+
+# 本地积分传感器的键名，与发现字段共用 unique_id 空间，发现时跳过
+INTEGRATED_FIELDS = frozenset(
+    {"estimatedDayGeneration", "peakPower", "averagePower", "capacityFactor"}
+)
+
+# 功率曲线中超过该间隔（秒）的相邻采样点不做积分
+MAX_CURVE_GAP = 3600
+# 没有可用功率曲线时，日发电量平均分到这些小时
+DAYLIGHT_HOURS = range(6, 18)
+
+# InverterSnapshot 属性 -> 逆变器详情中可能使用的字段名
+INVERTER_FIELDS: dict[str, tuple[str, ...]] = {
+    "power": ("power", "realPower", "pac", "acPower"),
+    "day_generation": ("dayGeneration", "dayEnergy", "eDay"),
+    "total_generation": ("totalGeneration", "totalEnergy", "eTotal"),
+}
+
+# 字段发现时跳过的标识类字段（按后缀匹配）
+NON_MEASUREMENT_SUFFIXES = ("Id", "id", "Time", "time", "Date", "date", "Type", "type", "Status", "status")
+
+
+@dataclass(frozen=True, slots=True)
+class StationSnapshot:
+    """One station detail payload, parsed and validated once per update."""
+
+    station_id: str
+    fetched_at: float
+    real_power: float | None = None
+    day_generation: float | None = None
+    month_generation: float | None = None
+    year_generation: float | None = None
+    total_generation: float | None = None
+    day_earn: float | None = None
+    total_earn: float | None = None
+    co2: float | None = None
+    coal: float | None = None
+    forest: float | None = None
+    # 字段发现模式下的其他数值字段，键为字段路径
+    extra: Mapping[str, float | None] = field(default_factory=dict)
+
+    @classmethod
+    def from_payload(
+        cls,
+        station_id: str,
+        payload: dict[str, Any],
+        fetched_at: float | None = None,
+        extra_keys: Iterable[str] = (),
+    ) -> StationSnapshot:
+        """Build a snapshot from a station detail payload."""
+        values = {
+            attr: _to_float(station_id, key, payload.get(key))
+            for key, attr in SNAPSHOT_FIELDS.items()
+        }
+        extra = {key: _to_float(station_id, key, _lookup(payload, key)) for key in extra_keys}
+        return cls(
+            station_id=station_id,
+            fetched_at=time.time() if fetched_at is None else fetched_at,
+            extra=extra,
+            **values,
+        )
+
+    def get(self, key: str) -> float | None:
+        """Return a value by its API field name or discovered field path."""
+        attr = SNAPSHOT_FIELDS.get(key)
+        if attr is None:
+            return self.extra.get(key)
+        return getattr(self, attr)
+
+
+def discover_numeric_fields(payload: dict[str, Any]) -> list[str]:
+    """Return the paths of numeric fields beyond ``SNAPSHOT_FIELDS``.
+
+    Keys of the locally integrated sensors are skipped so their unique ids stay unique.
+
+    Nested objects are walked one level deep and addressed as ``parent.child``.
+    Lists are skipped, as are identifiers, timestamps and status codes.
+    """
+    found: list[str] = []
+    for key, value in payload.items():
+        if (
+            key in SNAPSHOT_FIELDS
+            or key in INTEGRATED_FIELDS
+            or key.endswith(NON_MEASUREMENT_SUFFIXES)
+        ):
+            continue
+        if isinstance(value, dict):
+            found.extend(
+                f"{key}.{child}"
+                for child, child_value in value.items()
+                if not child.endswith(NON_MEASUREMENT_SUFFIXES) and _is_numeric(child_value)
+            )
+        elif _is_numeric(value):
+            found.append(key)
+    return found
+
+
+def _is_numeric(value: Any) -> bool:
+    if isinstance(value, bool) or value is None:
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    if not isinstance(value, str) or not value.strip():
+        return False
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _lookup(payload: dict[str, Any], path: str) -> Any:
+    if path in payload:
+        return payload[path]
+    parent, _, child = path.partition(".")
+    nested = payload.get(parent)
+    return nested.get(child) if isinstance(nested, dict) else None
+
+
+@dataclass(frozen=True, slots=True)
+class InverterInfo:
+    """One inverter of a station, as listed by the cloud."""
+
+    station_id: str
+    inverter_id: str
+    name: str
+    serial: str | None = None
+    model: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class InverterSnapshot:
+    """One inverter detail payload, parsed once per update."""
+
+    inverter_id: str
+    fetched_at: float
+    power: float | None = None  # W
+    day_generation: float | None = None  # kWh
+    total_generation: float | None = None  # kWh
+
+    @classmethod
+    def from_payload(
+        cls, inverter_id: str, payload: dict[str, Any], fetched_at: float | None = None
+    ) -> InverterSnapshot:
+        """Build a snapshot from an inverter detail payload."""
+        values = {
+            attr: _to_float(inverter_id, attr, _first(payload, keys))
+            for attr, keys in INVERTER_FIELDS.items()
+        }
+        return cls(
+            inverter_id=inverter_id,
+            fetched_at=time.time() if fetched_at is None else fetched_at,
+            **values,
+        )
+
+    def get(self, key: str) -> float | None:
+        return getattr(self, key, None)
+
+
+@dataclass(frozen=True, slots=True)
+class HistoryDay:
+    """One day of history: the cloud's day total and its power curve."""
+
+    station_id: str
+    day: date
+    generation: float | None  # kWh
+    curve: tuple[tuple[int, float], ...]  # (距当天零点的秒数, W)
+
+    def hourly_power(self) -> list[tuple[float, float, float] | None]:
+        """Return (mean, min, max) power in W for each hour, None without samples."""
+        buckets: list[list[float]] = [[] for _ in range(24)]
+        for seconds, power in self.curve:
+            hour = seconds // 3600
+            if 0 <= hour < 24:
+                buckets[hour].append(power)
+        return [
+            (sum(values) / len(values), min(values), max(values)) if values else None
+            for values in buckets
+        ]
+
+    def hourly_energy(self) -> list[float]:
+        """Integrate the curve into kWh per hour, scaled to the cloud's day total.
+
+        Without a usable curve the day total is spread evenly over
+        ``DAYLIGHT_HOURS``, so the day still adds its energy to the sum.
+        """
+        hours = [0.0] * 24
+        for (t0, p0), (t1, p1) in zip(self.curve, self.curve[1:]):
+            if t1 <= t0 or t1 - t0 > MAX_CURVE_GAP:
+                continue
+            # 梯形积分，跨整点的区间按线性插值拆分
+            while t0 < t1:
+                boundary = min((t0 // 3600 + 1) * 3600, t1)
+                p_boundary = p0 + (p1 - p0) * (boundary - t0) / (t1 - t0)
+                hour = t0 // 3600
+                if 0 <= hour < 24:
+                    hours[hour] += (p0 + p_boundary) / 2 * (boundary - t0) / 3_600_000
+                t0, p0 = boundary, p_boundary
+
+        integrated = sum(hours)
+        if self.generation is None:
+            return hours
+        if integrated > 0:
+            scale = self.generation / integrated
+            return [energy * scale for energy in hours]
+        share = self.generation / len(DAYLIGHT_HOURS)
+        return [share if hour in DAYLIGHT_HOURS else 0.0 for hour in range(24)]
+
+
+def parse_power_curve(data: Any) -> list[tuple[int, float]]:
+    """Parse a day curve response into sorted (seconds since midnight, W) samples."""
+    samples: dict[int, float] = {}
+    for item in _records(data):
+        seconds = _seconds_of_day(_first(item, ("time", "dataTime", "date", "x")))
+        power = _to_float("", "power", _first(item, ("power", "realPower", "value", "y")))
+        if seconds is not None and power is not None:
+            samples[seconds] = power
+    return sorted(samples.items())
+
+
+def parse_month_generation(data: Any) -> dict[date, float]:
+    """Parse a month generation response into kWh per day."""
+    totals: dict[date, float] = {}
+    for item in _records(data):
+        day = _to_date(_first(item, ("date", "time", "dataTime", "x")))
+        generation = _to_float(
+            "", "generation", _first(item, ("generation", "dayGeneration", "value", "y"))
+        )
+        if day is not None and generation is not None:
+            totals[day] = generation
+    return totals
+
+
+def parse_inverter_list(station_id: str, data: Any) -> list[InverterInfo]:
+    """Parse a station's inverter list, skipping entries without an id."""
+    inverters: dict[str, InverterInfo] = {}
+    for item in _records(data):
+        inverter_id = _first(item, ("inverterId", "deviceId", "id"))
+        serial = _first(item, ("sn", "serialNumber", "inverterSn", "deviceSn"))
+        if inverter_id is None:
+            inverter_id = serial
+        if inverter_id is None:
+            continue
+        inverter_id = str(inverter_id)
+        name = _first(item, ("name", "inverterName", "deviceName")) or serial or inverter_id
+        model = _first(item, ("model", "inverterModel", "deviceModel"))
+        inverters[inverter_id] = InverterInfo(
+            station_id=station_id,
+            inverter_id=inverter_id,
+            name=str(name),
+            serial=None if serial is None else str(serial),
+            model=None if model is None else str(model),
+        )
+    return list(inverters.values())
+
+
+def _records(data: Any) -> list[dict[str, Any]]:
+    if isinstance(data, dict):
+        for key in ("list", "records", "rows", "data"):
+            if isinstance(data.get(key), list):
+                data = data[key]
+                break
+    if not isinstance(data, list):
+        return []
+    return [item for item in data if isinstance(item, dict)]
+
+
+def _first(item: dict[str, Any], keys: tuple[str, ...]) -> Any:
+    for key in keys:
+        if item.get(key) is not None:
+            return item[key]
+    return None
+
+
+def _to_datetime(value: Any) -> datetime | None:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # 毫秒时间戳
+        return datetime.fromtimestamp(value / 1000 if value > 1e11 else value)
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _seconds_of_day(value: Any) -> int | None:
+    if isinstance(value, str) and value.count("-") == 0 and ":" in value:
+        parts = value.strip().split(":")
+        try:
+            numbers = [int(part) for part in parts] + [0, 0]
+        except ValueError:
+            return None
+        return numbers[0] * 3600 + numbers[1] * 60 + numbers[2]
+    moment = _to_datetime(value)
+    if moment is None:
+        return None
+    return moment.hour * 3600 + moment.minute * 60 + moment.second
+
+
+def _to_date(value: Any) -> date | None:
+    moment = _to_datetime(value)
+    return None if moment is None else moment.date()
+
+
+def _to_float(station_id: str, key: str, value: Any) -> float | None:
+    """Convert an API value to float, logging values that cannot be parsed."""
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        _LOGGER.warning(
+            "Could not convert value %s for sensor %s of station %s", value, key, station_id
+        )
+        return None
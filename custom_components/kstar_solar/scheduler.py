@@ -0,0 +1,85 @@
+"""Adaptive poll interval for Kstar Solar Inverter."""
+import random
+from typing import Optional
+
+# 太阳高度角低于该值且无功率时视为夜间
+NIGHT_ELEVATION = -3.0
+# 日出后太阳高度角低于该值时视为爬坡阶段
+RAMP_ELEVATION = 15.0
+# 功率相对变化超过该比例时视为正在变化
+POWER_CHANGE_THRESHOLD = 0.1
+BACKOFF_FACTOR = 2.0
+JITTER = 0.1
+
+
+class AdaptivePollScheduler:
+    """Pick the next poll interval from sun position and recent power changes.
+
+    Polls at ``min_interval`` while the sun is coming up or power is moving,
+    backs off towards ``max_interval`` while readings are steady and drops to
+    ``night_interval`` once it is dark and the station produces nothing.
+    """
+
+    def __init__(
+        self,
+        min_interval: float,
+        max_interval: float,
+        night_interval: float,
+        initial_interval: float,
+        jitter: float = JITTER,
+    ) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.night_interval = night_interval
+        self.jitter = jitter
+        self._interval = self._clamp(initial_interval)
+        self._last_power: Optional[float] = None
+
+    def set_bounds(
+        self, min_interval: float, max_interval: float, night_interval: float
+    ) -> None:
+        """Change the interval limits, clamping the current interval to them."""
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.night_interval = night_interval
+        self._interval = self._clamp(self._interval)
+
+    def _clamp(self, interval: float) -> float:
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def next_interval(
+        self,
+        power: Optional[float],
+        sun_elevation: Optional[float] = None,
+        sun_rising: Optional[bool] = None,
+    ) -> float:
+        """Record the latest total power and return seconds until the next poll."""
+        last_power, self._last_power = self._last_power, power
+        producing = power is not None and power > 0
+
+        if sun_elevation is not None and sun_elevation < NIGHT_ELEVATION and not producing:
+            self._interval = self.night_interval
+        elif sun_rising and sun_elevation is not None and 0 <= sun_elevation < RAMP_ELEVATION:
+            self._interval = self.min_interval
+        elif self._power_changed(last_power, power):
+            self._interval = self.min_interval
+        elif sun_elevation is None and not producing and not last_power:
+            # 没有太阳位置信息时，连续无功率按夜间逐步退避
+            self._interval = min(self._interval * BACKOFF_FACTOR, self.night_interval)
+        else:
+            self._interval = self._clamp(self._interval * BACKOFF_FACTOR)
+
+        return self.jittered_interval()
+
+    def jittered_interval(self) -> float:
+        """Return the current interval with random jitter applied."""
+        return self._interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    @staticmethod
+    def _power_changed(last_power: Optional[float], power: Optional[float]) -> bool:
+        if last_power is None or power is None:
+            return False
+        scale = max(abs(last_power), abs(power))
+        if scale == 0:
+            return False
+        return abs(power - last_power) / scale > POWER_CHANGE_THRESHOLD
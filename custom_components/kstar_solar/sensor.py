@@ -2,33 +2,270 @@
 from __future__ import annotations
 
 import logging
-from datetime import datetime
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
 from typing import Any
 
 from homeassistant.components.sensor import (
     SensorDeviceClass,
     SensorEntity,
+    SensorEntityDescription,
     SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (
+    PERCENTAGE,
+    EntityCategory,
     UnitOfEnergy,
     UnitOfPower,
     UnitOfArea,
     UnitOfMass,
+    UnitOfTime,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import StateType
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-    DataUpdateCoordinator,
-)
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util
 
-from .const import DOMAIN, SENSOR_TYPES, SCAN_INTERVAL
+from .const import DOMAIN, SENSOR_TYPES
+from .coordinator import INTEGRATED_CONTEXT, KstarInverterCoordinator, KstarSolarCoordinator
+from .integrator import PowerIntegrator
+from .models import InverterInfo, StationSnapshot
+from .stats import ClientStats
 
 _LOGGER = logging.getLogger(__name__)
 
+DEVICE_CLASSES = {
+    "power": SensorDeviceClass.POWER,
+    "energy": SensorDeviceClass.ENERGY,
+    "monetary": SensorDeviceClass.MONETARY,
+    "weight": SensorDeviceClass.WEIGHT,
+    "area": SensorDeviceClass.AREA,
+}
+
+# 未列出的传感器默认为 TOTAL
+STATE_CLASSES = {
+    "realPower": SensorStateClass.MEASUREMENT,
+    "totalGeneration": SensorStateClass.TOTAL_INCREASING,
+}
+
+UNITS = {
+    "W": UnitOfPower.WATT,
+    "kWh": UnitOfEnergy.KILO_WATT_HOUR,
+    "元": "元",  # 直接使用字符串，不使用常量
+    "kg": UnitOfMass.KILOGRAMS,
+    "m²": UnitOfArea.SQUARE_METERS,
+}
+
+# 发现字段按字段名后缀推断类型：(后缀, 设备类别, 单位, 状态类别)
+# 发现的发电量可能按日/月/年清零，与内置的周期发电量一样用 TOTAL
+DISCOVERED_HINTS = (
+    ("Generation", SensorDeviceClass.ENERGY, UnitOfEnergy.KILO_WATT_HOUR, SensorStateClass.TOTAL),
+    ("Power", SensorDeviceClass.POWER, UnitOfPower.WATT, SensorStateClass.MEASUREMENT),
+)
+
+SENSOR_DESCRIPTIONS: tuple[SensorEntityDescription, ...] = tuple(
+    SensorEntityDescription(
+        key=sensor_type,
+        name=sensor_info["name"],
+        icon=sensor_info["icon"],
+        device_class=DEVICE_CLASSES.get(sensor_info["device_class"]),
+        state_class=STATE_CLASSES.get(sensor_type, SensorStateClass.TOTAL),
+        native_unit_of_measurement=UNITS.get(sensor_info["unit"], sensor_info["unit"]),
+    )
+    for sensor_type, sensor_info in SENSOR_TYPES.items()
+)
+
+
+def _discovered_description(key: str) -> SensorEntityDescription:
+    """Describe a field found by discovery, guessing its kind from the name."""
+    leaf = key.rpartition(".")[2]
+    for suffix, device_class, unit, state_class in DISCOVERED_HINTS:
+        if leaf.endswith(suffix) or leaf == suffix.lower():
+            return SensorEntityDescription(
+                key=key,
+                name=key,
+                icon="mdi:chart-box-outline",
+                device_class=device_class,
+                state_class=state_class,
+                native_unit_of_measurement=unit,
+            )
+    return SensorEntityDescription(
+        key=key,
+        name=key,
+        icon="mdi:chart-box-outline",
+        state_class=SensorStateClass.MEASUREMENT,
+    )
+
+
+@dataclass(frozen=True, kw_only=True)
+class KstarSolarIntegratedEntityDescription(SensorEntityDescription):
+    """Describes a sensor derived locally from realPower samples."""
+
+    value_fn: Callable[[PowerIntegrator, float], float | None]
+
+
+def _rounded(value: float | None, digits: int) -> float | None:
+    return None if value is None else round(value, digits)
+
+
+# 新增键名时同步更新 models.INTEGRATED_FIELDS
+INTEGRATED_DESCRIPTIONS: tuple[KstarSolarIntegratedEntityDescription, ...] = (
+    KstarSolarIntegratedEntityDescription(
+        key="estimatedDayGeneration",
+        name="日发电量（本地估算）",
+        icon="mdi:solar-panel",
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL,
+        native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+        value_fn=lambda integrator, now: round(integrator.day_energy, 3),
+    ),
+    KstarSolarIntegratedEntityDescription(
+        key="peakPower",
+        name="峰值功率（1小时）",
+        icon="mdi:chart-bell-curve",
+        device_class=SensorDeviceClass.POWER,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfPower.WATT,
+        value_fn=lambda integrator, now: integrator.peak_power,
+    ),
+    KstarSolarIntegratedEntityDescription(
+        key="averagePower",
+        name="平均功率（1小时）",
+        icon="mdi:chart-line",
+        device_class=SensorDeviceClass.POWER,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfPower.WATT,
+        value_fn=lambda integrator, now: _rounded(integrator.average_power, 1),
+    ),
+    KstarSolarIntegratedEntityDescription(
+        key="capacityFactor",
+        name="容量系数",
+        icon="mdi:percent-outline",
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=PERCENTAGE,
+        value_fn=lambda integrator, now: _rounded(integrator.capacity_factor(now), 2),
+    ),
+)
+
+
+INVERTER_DESCRIPTIONS: tuple[SensorEntityDescription, ...] = (
+    SensorEntityDescription(
+        key="power",
+        name="功率",
+        icon="mdi:solar-power",
+        device_class=SensorDeviceClass.POWER,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfPower.WATT,
+    ),
+    SensorEntityDescription(
+        key="day_generation",
+        name="日发电量",
+        icon="mdi:solar-panel",
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+    ),
+    SensorEntityDescription(
+        key="total_generation",
+        name="总发电量",
+        icon="mdi:solar-panel-large",
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+        # 需要时再启用，减少逆变器请求
+        entity_registry_enabled_default=False,
+    ),
+)
+
+
+@dataclass(frozen=True, kw_only=True)
+class KstarSolarDiagnosticEntityDescription(SensorEntityDescription):
+    """Describes a sensor reading the API client's statistics."""
+
+    value_fn: Callable[[ClientStats], StateType]
+    attributes_fn: Callable[[ClientStats], dict[str, Any]] | None = None
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _counter(name: str) -> Callable[[ClientStats], StateType]:
+    return lambda stats: stats.counters[name]
+
+
+def _latency_description(
+    key: str, name: str, timer: str, pct: float
+) -> KstarSolarDiagnosticEntityDescription:
+    return KstarSolarDiagnosticEntityDescription(
+        key=key,
+        name=name,
+        icon="mdi:timer-outline",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda stats: _ms(stats.timers[timer].percentile(pct)),
+    )
+
+
+DIAGNOSTIC_DESCRIPTIONS: tuple[KstarSolarDiagnosticEntityDescription, ...] = (
+    KstarSolarDiagnosticEntityDescription(
+        key="logins",
+        name="登录次数",
+        icon="mdi:login",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=_counter("logins"),
+    ),
+    KstarSolarDiagnosticEntityDescription(
+        key="token_refreshes",
+        name="Token刷新次数",
+        icon="mdi:key-change",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=_counter("refreshes"),
+    ),
+    KstarSolarDiagnosticEntityDescription(
+        key="retries_401",
+        name="401重试次数",
+        icon="mdi:shield-refresh",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=_counter("retries_401"),
+    ),
+    KstarSolarDiagnosticEntityDescription(
+        key="retries",
+        name="请求重试次数",
+        icon="mdi:refresh",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=_counter("retries"),
+    ),
+    KstarSolarDiagnosticEntityDescription(
+        key="errors",
+        name="请求错误次数",
+        icon="mdi:alert-circle-outline",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda stats: stats.error_count,
+        attributes_fn=lambda stats: {
+            "by_type": dict(stats.errors),
+            "last_error": stats.last_error,
+        },
+    ),
+    _latency_description("fetch_latency_p50", "请求耗时P50", "fetch", 50),
+    _latency_description("fetch_latency_p99", "请求耗时P99", "fetch", 99),
+    KstarSolarDiagnosticEntityDescription(
+        key="poll_duration",
+        name="轮询耗时",
+        icon="mdi:timer-sand",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda stats: _ms(stats.timers["poll"].last),
+    ),
+)
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -36,138 +273,354 @@ async def async_setup_entry(
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """Set up the Kstar Solar Inverter sensors."""
-    api = hass.data[DOMAIN][entry.entry_id]
-
-    coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name="kstar_solar",
-        update_method=api.get_station_data,
-        update_interval=SCAN_INTERVAL,
-    )
+    coordinator: KstarSolarCoordinator = hass.data[DOMAIN][entry.entry_id]
+    station_ids = coordinator.station_ids
 
-    # Fetch initial data
-    await coordinator.async_config_entry_first_refresh()
+    # 单电站保持原有的实体 ID，多电站时按电站区分
+    multi_station = len(station_ids) > 1
+    entities: list[SensorEntity] = [
+        KstarSolarSensor(coordinator, entry, station_id, description, multi_station)
+        for station_id in station_ids
+        for description in SENSOR_DESCRIPTIONS
+    ]
+    entities.extend(
+        KstarSolarSensor(
+            coordinator, entry, station_id, _discovered_description(key), multi_station
+        )
+        for station_id in station_ids
+        for key in coordinator.schema.get(station_id, ())
+    )
+    entities.extend(
+        KstarSolarIntegratedSensor(coordinator, entry, station_id, description, multi_station)
+        for station_id in station_ids
+        for description in INTEGRATED_DESCRIPTIONS
+        # 未配置装机容量时不创建容量系数传感器
+        if description.key != "capacityFactor"
+        or coordinator.integrators[station_id].capacity
+    )
+    entities.extend(
+        KstarSolarDiagnosticSensor(coordinator, entry, description)
+        for description in DIAGNOSTIC_DESCRIPTIONS
+    )
+    async_add_entities(entities)
 
-    entities = []
-    for sensor_type, sensor_info in SENSOR_TYPES.items():
-        entities.append(
+    @callback
+    def _async_schema_changed(station_id: str, added: list[str], removed: list[str]) -> None:
+        """Add entities for new fields and retire those of vanished ones."""
+        async_add_entities(
             KstarSolarSensor(
-                coordinator,
-                entry,
-                sensor_type,
-                sensor_info,
+                coordinator, entry, station_id, _discovered_description(key), multi_station
             )
+            for key in added
         )
+        registry = er.async_get(hass)
+        for key in removed:
+            unique_id = _unique_id(entry, station_id, key, multi_station)
+            if entity_id := registry.async_get_entity_id("sensor", DOMAIN, unique_id):
+                registry.async_remove(entity_id)
 
-    async_add_entities(entities)
+    entry.async_on_unload(coordinator.async_add_schema_listener(_async_schema_changed))
+
+    inverter_coordinator = coordinator.inverter_coordinator
+    discovery: dict[str, Any] = {"running": False, "unsub": None}
+
+    async def _async_add_inverters() -> None:
+        """List the inverters of unlisted stations and add a device with sensors for each."""
+        try:
+            inverters = await inverter_coordinator.async_discover(station_ids)
+        finally:
+            discovery["running"] = False
+        _LOGGER.debug("Found %d inverters", len(inverters))
+        async_add_entities(
+            KstarSolarInverterSensor(inverter_coordinator, entry, info, description)
+            for info in inverters
+            for description in INVERTER_DESCRIPTIONS
+        )
+        if inverter_coordinator.listed_stations.issuperset(station_ids):
+            _async_stop_discovery()
+
+    @callback
+    def _async_start_discovery() -> None:
+        if discovery["running"]:
+            return
+        discovery["running"] = True
+        # 逆变器列表不影响电站传感器，放在后台获取
+        entry.async_create_background_task(
+            hass, _async_add_inverters(), f"{DOMAIN} inverter discovery {entry.title}"
+        )
+
+    @callback
+    def _async_retry_discovery() -> None:
+        """Retry unlisted stations after a poll that reached the cloud."""
+        if coordinator.last_update_success and not coordinator.stale_stations.issuperset(
+            station_ids
+        ):
+            _async_start_discovery()
+
+    @callback
+    def _async_stop_discovery() -> None:
+        if (unsub := discovery["unsub"]) is not None:
+            discovery["unsub"] = None
+            unsub()
+
+    # 启动时云端可能不可用，之后每次成功轮询都重试退避已到期的电站
+    discovery["unsub"] = coordinator.async_add_listener(_async_retry_discovery)
+    entry.async_on_unload(_async_stop_discovery)
+    _async_start_discovery()
+
+
+def _station_device_info(station_id: str) -> DeviceInfo:
+    return DeviceInfo(
+        identifiers={(DOMAIN, station_id)},
+        name=f"Kstar Solar {station_id}",
+        manufacturer="Kstar",
+        model="光伏电站",
+    )
+
+
+def _unique_id(entry: ConfigEntry, station_id: str, key: str, multi_station: bool) -> str:
+    if multi_station:
+        return f"{entry.entry_id}_{station_id}_{key}"
+    return f"{entry.entry_id}_{key}"
 
 
-class KstarSolarSensor(CoordinatorEntity, SensorEntity):
-    """Representation of a Kstar Solar Inverter sensor."""
+class KstarSolarSensor(CoordinatorEntity[KstarSolarCoordinator], SensorEntity):
+    """Representation of a Kstar Solar Inverter sensor.
+
+    The value is computed once per coordinator update and cached in
+    ``_attr_native_value``.
+    """
 
     def __init__(
         self,
-        coordinator: DataUpdateCoordinator,
+        coordinator: KstarSolarCoordinator,
         entry: ConfigEntry,
-        sensor_type: str,
-        sensor_info: dict[str, Any],
+        station_id: str,
+        description: SensorEntityDescription,
+        multi_station: bool = False,
     ) -> None:
         """Initialize the sensor."""
-        super().__init__(coordinator)
-        self._sensor_type = sensor_type
-        self._sensor_info = sensor_info
-        self._attr_name = f"Kstar Solar {sensor_info['name']}"
-        self._attr_unique_id = f"{entry.entry_id}_{sensor_type}"
-        self._attr_device_class = self._get_device_class(sensor_info["device_class"])
-        self._attr_state_class = self._get_state_class(sensor_type)
-        self._attr_native_unit_of_measurement = self._get_unit_of_measurement(
-            sensor_info["unit"]
+        super().__init__(coordinator, context=(station_id, description.key))
+        self.entity_description = description
+        self._station_id = station_id
+        self._sensor_type = description.key
+        if multi_station:
+            self._attr_name = f"Kstar Solar {station_id} {description.name}"
+        else:
+            self._attr_name = f"Kstar Solar {description.name}"
+        self._attr_unique_id = _unique_id(entry, station_id, description.key, multi_station)
+        self._attr_device_info = _station_device_info(station_id)
+        # 只有内置的 TOTAL_INCREASING 字段在云端返回 0 时保持上次的值
+        self._hold_last_value = (
+            STATE_CLASSES.get(description.key) == SensorStateClass.TOTAL_INCREASING
         )
-        self._attr_icon = sensor_info["icon"]
-        self._last_valid_value = None
+        self._last_valid_value: float | None = None
+        self._update_from_coordinator()
+
+    async def async_added_to_hass(self) -> None:
+        """Catch up with data that arrived while the entity was being added."""
+        await super().async_added_to_hass()
+        self._update_from_coordinator()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Recompute the cached value, then write state."""
+        self._update_from_coordinator()
+        super()._handle_coordinator_update()
 
     @property
-    def native_value(self) -> StateType:
-        """Return the state of the sensor."""
-        if self.coordinator.data is None:
-            return None
+    def available(self) -> bool:
+        """Return True if entity is available."""
+        return self._attr_available
 
-        value = self.coordinator.data.get(self._sensor_type)
-        if value is None:
-            return None
+    def _update_from_coordinator(self) -> None:
+        """Compute value and availability from the latest snapshot."""
+        data = self.coordinator.data
+        snapshot = data.get(self._station_id) if data is not None else None
+        self._attr_available = self.coordinator.station_available(self._station_id)
+        if snapshot is None:
+            self._attr_native_value = None
+            return
+        self._attr_extra_state_attributes = _stale_attributes(
+            self.coordinator, self._station_id, snapshot
+        )
 
-        # Convert to appropriate type
-        try:
-            if isinstance(value, (int, float)):
-                converted_value = value
-            elif isinstance(value, str):
-                # Try to convert string to float
-                converted_value = float(value)
-            else:
-                converted_value = value
-
-            # 对于total_increasing类型的传感器，如果值为0且之前有有效值，则保持之前的值
-            if (self._attr_state_class == SensorStateClass.TOTAL_INCREASING and 
-                converted_value == 0 and 
-                hasattr(self, '_last_valid_value') and 
-                self._last_valid_value is not None and 
-                self._last_valid_value > 0):
-                _LOGGER.debug("传感器 %s 检测到0值，保持之前的有效值: %s", self._sensor_type, self._last_valid_value)
-                return self._last_valid_value
-            else:
-                # 更新最后有效值
-                if converted_value is not None and converted_value > 0:
-                    self._last_valid_value = converted_value
-                return converted_value
-
-        except (ValueError, TypeError):
-            _LOGGER.warning("Could not convert value %s for sensor %s", value, self._sensor_type)
-            return None
+        value = snapshot.get(self._sensor_type)
+
+        # 对于total_increasing类型的传感器，如果值为0且之前有有效值，则保持之前的值
+        if (
+            self._hold_last_value
+            and value == 0
+            and self._last_valid_value is not None
+            and self._last_valid_value > 0
+        ):
+            _LOGGER.debug("传感器 %s 检测到0值，保持之前的有效值: %s", self._sensor_type, self._last_valid_value)
+            value = self._last_valid_value
+        elif value is not None and value > 0:
+            # 更新最后有效值
+            self._last_valid_value = value
+
+        self._attr_native_value = value
+
+
+class KstarSolarIntegratedSensor(CoordinatorEntity[KstarSolarCoordinator], SensorEntity):
+    """Energy and power statistics integrated locally from realPower."""
+
+    entity_description: KstarSolarIntegratedEntityDescription
+
+    def __init__(
+        self,
+        coordinator: KstarSolarCoordinator,
+        entry: ConfigEntry,
+        station_id: str,
+        description: KstarSolarIntegratedEntityDescription,
+        multi_station: bool = False,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, context=(station_id, INTEGRATED_CONTEXT))
+        self.entity_description = description
+        self._station_id = station_id
+        self._integrator = coordinator.integrators[station_id]
+        if multi_station:
+            self._attr_name = f"Kstar Solar {station_id} {description.name}"
+            self._attr_unique_id = f"{entry.entry_id}_{station_id}_{description.key}"
+        else:
+            self._attr_name = f"Kstar Solar {description.name}"
+            self._attr_unique_id = f"{entry.entry_id}_{description.key}"
+        self._attr_device_info = _station_device_info(station_id)
+        self._update_from_integrator()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Recompute the cached value, then write state."""
+        self._update_from_integrator()
+        super()._handle_coordinator_update()
 
     @property
     def available(self) -> bool:
         """Return True if entity is available."""
-        return self.coordinator.last_update_success
-
-    def _get_device_class(self, device_class: str) -> SensorDeviceClass | None:
-        """Get the device class."""
-        if device_class == "power":
-            return SensorDeviceClass.POWER
-        elif device_class == "energy":
-            return SensorDeviceClass.ENERGY
-        elif device_class == "monetary":
-            return SensorDeviceClass.MONETARY
-        elif device_class == "weight":
-            return SensorDeviceClass.WEIGHT
-        elif device_class == "area":
-            return SensorDeviceClass.AREA
-        return None
+        return self._attr_available
+
+    def _update_from_integrator(self) -> None:
+        integrator = self._integrator
+        now = dt_util.utcnow()
+        self._attr_available = (
+            self.coordinator.station_available(self._station_id)
+            and integrator.sample_count > 0
+        )
+        self._attr_native_value = self.entity_description.value_fn(
+            integrator, now.timestamp()
+        )
+        if self.entity_description.state_class == SensorStateClass.TOTAL:
+            # 与累计值同一天的零点，跨零点后第一个样本到达前不提前重置
+            day_start = integrator.day_start
+            self._attr_last_reset = (
+                None
+                if day_start is None
+                else dt_util.as_local(dt_util.utc_from_timestamp(day_start))
+            )
+            self._attr_extra_state_attributes = {"cloud_drift": integrator.drift_kwh}
+
+
+class KstarSolarInverterSensor(CoordinatorEntity[KstarInverterCoordinator], SensorEntity):
+    """One value of an inverter, fetched only while the entity is enabled."""
+
+    def __init__(
+        self,
+        coordinator: KstarInverterCoordinator,
+        entry: ConfigEntry,
+        info: InverterInfo,
+        description: SensorEntityDescription,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, context=(info.inverter_id, description.key))
+        self.entity_description = description
+        self._inverter_id = info.inverter_id
+        self._attr_name = f"Kstar Solar {info.name} {description.name}"
+        self._attr_unique_id = (
+            f"{entry.entry_id}_inverter_{info.inverter_id}_{description.key}"
+        )
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, f"inverter_{info.inverter_id}")},
+            name=f"Kstar Solar {info.name}",
+            manufacturer="Kstar",
+            model=info.model,
+            serial_number=info.serial,
+            via_device=(DOMAIN, info.station_id),
+        )
+        self._update_from_coordinator()
+
+    async def async_added_to_hass(self) -> None:
+        """Register, then fetch right away if this inverter has no data yet."""
+        await super().async_added_to_hass()
+        if self._inverter_id not in (self.coordinator.data or {}):
+            # 多个实体同时加入时由防抖合并为一次刷新
+            await self.coordinator.async_request_refresh()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Recompute the cached value, then write state."""
+        self._update_from_coordinator()
+        super()._handle_coordinator_update()
+
+    @property
+    def available(self) -> bool:
+        """Return True if entity is available."""
+        return self._attr_available
+
+    def _update_from_coordinator(self) -> None:
+        snapshot = (self.coordinator.data or {}).get(self._inverter_id)
+        self._attr_available = self.coordinator.last_update_success and snapshot is not None
+        self._attr_native_value = (
+            None if snapshot is None else snapshot.get(self.entity_description.key)
+        )
+
 
-    def _get_state_class(self, sensor_type: str) -> SensorStateClass | None:
-        """Get the state class."""
-        if sensor_type in ["realPower"]:
-            return SensorStateClass.MEASUREMENT
-        elif sensor_type in ["dayGeneration", "monthGeneration", "yearGeneration"]:
-            return SensorStateClass.TOTAL
-        elif sensor_type in ["totalGeneration"]:
-            return SensorStateClass.TOTAL_INCREASING
-        elif sensor_type in ["dayEarn", "totalEarn"]:
-            return SensorStateClass.TOTAL
-        elif sensor_type in ["co2", "coal", "forest"]:
-            return SensorStateClass.TOTAL
+def _stale_attributes(
+    coordinator: KstarSolarCoordinator, station_id: str, snapshot: StationSnapshot
+) -> dict[str, Any] | None:
+    """Return the data age of a snapshot the last poll could not refresh."""
+    if station_id not in coordinator.stale_stations:
         return None
+    return {
+        "data_age": round(time.time() - snapshot.fetched_at),
+        "fetched_at": dt_util.utc_from_timestamp(snapshot.fetched_at).isoformat(),
+    }
+
+
+class KstarSolarDiagnosticSensor(CoordinatorEntity[KstarSolarCoordinator], SensorEntity):
+    """Client statistics for one config entry, disabled by default."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    entity_description: KstarSolarDiagnosticEntityDescription
+
+    def __init__(
+        self,
+        coordinator: KstarSolarCoordinator,
+        entry: ConfigEntry,
+        description: KstarSolarDiagnosticEntityDescription,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self.entity_description = description
+        self._attr_name = f"Kstar Solar {description.name}"
+        self._attr_unique_id = f"{entry.entry_id}_diagnostic_{description.key}"
+        self._update_from_stats()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Refresh the statistics, then write state."""
+        self._update_from_stats()
+        super()._handle_coordinator_update()
+
+    @property
+    def available(self) -> bool:
+        """Statistics stay available while the cloud is failing."""
+        return True
 
-    def _get_unit_of_measurement(self, unit: str) -> str | None:
-        """Get the unit of measurement."""
-        if unit == "W":
-            return UnitOfPower.WATT
-        elif unit == "kWh":
-            return UnitOfEnergy.KILO_WATT_HOUR
-        elif unit == "元":
-            return "元"  # 直接使用字符串，不使用常量
-        elif unit == "kg":
-            return UnitOfMass.KILOGRAMS
-        elif unit == "m²":
-            return UnitOfArea.SQUARE_METERS
-        return unit 
\ No newline at end of file
+    def _update_from_stats(self) -> None:
+        stats = self.coordinator.api.stats
+        self._attr_native_value = self.entity_description.value_fn(stats)
+        if self.entity_description.attributes_fn is not None:
+            self._attr_extra_state_attributes = self.entity_description.attributes_fn(stats)
@@ -0,0 +1,175 @@
+"""Services for Kstar Solar Inverter."""
+from __future__ import annotations
+
+import logging
+import time
+from datetime import timedelta
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DATA_FORCED_REFRESH,
+    DOMAIN,
+    FORCE_REFRESH_INTERVAL,
+    SERVICE_BACKFILL_HISTORY,
+    SERVICE_GET_STATION_SNAPSHOT,
+)
+from .coordinator import KstarSolarCoordinator
+from .models import SNAPSHOT_FIELDS, StationSnapshot
+
+_LOGGER = logging.getLogger(__name__)
+
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_STATION_ID = "station_id"
+ATTR_START_DATE = "start_date"
+ATTR_END_DATE = "end_date"
+ATTR_FORCE_REFRESH = "force_refresh"
+
+BACKFILL_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_STATION_ID): cv.string,
+        vol.Required(ATTR_START_DATE): cv.date,
+        vol.Optional(ATTR_END_DATE): cv.date,
+    }
+)
+
+SNAPSHOT_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_STATION_ID): cv.string,
+        vol.Optional(ATTR_FORCE_REFRESH, default=False): cv.boolean,
+    }
+)
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the integration's services."""
+
+    async def async_handle_backfill(call: ServiceCall) -> None:
+        """Start a history backfill in the background."""
+        entry_id = call.data[ATTR_CONFIG_ENTRY_ID]
+        coordinator = _get_coordinator(hass, entry_id)
+        station_ids = _get_station_ids(coordinator, entry_id, call.data.get(ATTR_STATION_ID))
+
+        start = call.data[ATTR_START_DATE]
+        end = call.data.get(ATTR_END_DATE) or dt_util.now().date() - timedelta(days=1)
+        if start > end:
+            raise ServiceValidationError("start_date must not be after end_date")
+
+        # 回填依赖 recorder，只在调用服务时导入
+        from .backfill import HistoryBackfill  # pylint: disable=import-outside-toplevel
+
+        backfill = HistoryBackfill(hass, coordinator, entry_id)
+
+        async def _run() -> None:
+            for station_id in station_ids:
+                try:
+                    await backfill.async_run(station_id, start, end)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception(
+                        "History backfill for station %s stopped; call the service "
+                        "again to resume",
+                        station_id,
+                    )
+
+        hass.async_create_background_task(
+            _run(), f"{DOMAIN} backfill {entry_id}"
+        )
+
+    async def async_handle_get_snapshot(call: ServiceCall) -> ServiceResponse:
+        """Return the parsed station data, from the client cache when fresh enough."""
+        entry_id = call.data[ATTR_CONFIG_ENTRY_ID]
+        coordinator = _get_coordinator(hass, entry_id)
+        station_ids = _get_station_ids(coordinator, entry_id, call.data.get(ATTR_STATION_ID))
+        api = coordinator.api
+
+        max_age = None
+        if call.data[ATTR_FORCE_REFRESH]:
+            forced = hass.data[DOMAIN].setdefault(DATA_FORCED_REFRESH, {})
+            now = time.monotonic()
+            last = forced.get(entry_id)
+            if last is None or now - last >= FORCE_REFRESH_INTERVAL:
+                forced[entry_id] = now
+                max_age = 0
+            else:
+                # 强制刷新过于频繁时退回到缓存
+                _LOGGER.debug(
+                    "Forced refresh of %s was %.0fs ago, serving cached data",
+                    entry_id,
+                    now - last,
+                )
+
+        results = await api.get_stations_data(station_ids, max_age)
+        stations: dict[str, Any] = {}
+        for station_id, result in results.items():
+            if isinstance(result, Exception):
+                stations[station_id] = {"error": str(result)}
+                continue
+            age = api.data_age(station_id) or 0.0
+            snapshot = StationSnapshot.from_payload(
+                station_id,
+                result,
+                fetched_at=time.time() - age,
+                extra_keys=coordinator.schema.get(station_id, ()),
+            )
+            stations[station_id] = _snapshot_response(snapshot, age)
+
+        if all("error" in station for station in stations.values()):
+            error = next(iter(stations.values()))["error"]
+            raise HomeAssistantError(f"Failed to get station data: {error}")
+        return {"stations": stations}
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_BACKFILL_HISTORY, async_handle_backfill, schema=BACKFILL_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_STATION_SNAPSHOT,
+        async_handle_get_snapshot,
+        schema=SNAPSHOT_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+
+def _snapshot_response(snapshot: StationSnapshot, age: float) -> dict[str, Any]:
+    """Serialise a snapshot keyed by the API's field names."""
+    response: dict[str, Any] = {
+        "fetched_at": dt_util.utc_from_timestamp(snapshot.fetched_at).isoformat(),
+        "age": round(age, 1),
+    }
+    response.update((key, snapshot.get(key)) for key in SNAPSHOT_FIELDS)
+    response.update(snapshot.extra)
+    return response
+
+
+def _get_station_ids(
+    coordinator: KstarSolarCoordinator, entry_id: str, station_id: str | None
+) -> list[str]:
+    """Return the requested station, or every station of the entry."""
+    if not station_id:
+        return coordinator.station_ids
+    if station_id not in coordinator.station_ids:
+        raise ServiceValidationError(
+            f"Station {station_id} is not configured in entry {entry_id}"
+        )
+    return [station_id]
+
+
+def _get_coordinator(hass: HomeAssistant, entry_id: str) -> KstarSolarCoordinator:
+    """Return the coordinator of a loaded config entry."""
+    coordinator = hass.data.get(DOMAIN, {}).get(entry_id)
+    if not isinstance(coordinator, KstarSolarCoordinator):
+        raise ServiceValidationError(f"Config entry {entry_id} is not loaded")
+    return coordinator
@@ -0,0 +1,139 @@
+"""Request counters and latency histograms for Kstar Solar Inverter."""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import aiohttp
+
+# 延迟直方图的桶上界（秒），最后一个桶收纳所有更慢的请求
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+TIMERS = ("login", "refresh", "fetch", "decode", "parse", "snapshot", "poll")
+COUNTERS = (
+    "logins",
+    "refreshes",
+    "fetches",
+    "retries",
+    "retries_401",
+    "coalesced",
+    "cache_hits",
+    "served_stale",
+)
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram with O(1) memory."""
+
+    __slots__ = ("count", "total", "max", "last", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last: float | None = None
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def percentile(self, pct: float) -> float | None:
+        """Return the upper bound of the bucket holding the percentile."""
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for bound, hits in zip(LATENCY_BUCKETS, self.buckets):
+            seen += hits
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max if self.count else None,
+            "last": self.last,
+            "buckets": {
+                str(bound): hits for bound, hits in zip(LATENCY_BUCKETS, self.buckets) if hits
+            },
+        }
+
+
+class ClientStats:
+    """Counters, latency histograms and an error taxonomy for one API client."""
+
+    def __init__(self) -> None:
+        self.counters: Counter[str] = Counter({name: 0 for name in COUNTERS})
+        self.timers = {name: LatencyHistogram() for name in TIMERS}
+        self.errors: Counter[str] = Counter()
+        self.last_error: str | None = None
+        self.last_error_at: float | None = None
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        self.timers[name].observe(seconds)
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        """Record how long the block took, whether or not it raised."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name].observe(time.perf_counter() - start)
+
+    def record_error(self, err: BaseException) -> str:
+        """Classify an error, count it and return its category."""
+        category = classify_error(err)
+        self.errors[category] += 1
+        self.last_error = f"{category}: {err}"
+        self.last_error_at = time.time()
+        return category
+
+    @property
+    def error_count(self) -> int:
+        return sum(self.errors.values())
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "counters": dict(self.counters),
+            "timers": {name: hist.as_dict() for name, hist in self.timers.items()},
+            "errors": dict(self.errors),
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+        }
+
+
+def classify_error(err: BaseException) -> str:
+    """Map an exception, or the error that caused it, to a short category."""
+    seen: set[int] = set()
+    current: BaseException | None = err
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if isinstance(current, asyncio.TimeoutError):
+            return "timeout"
+        if isinstance(current, aiohttp.ClientResponseError):
+            return f"http_{current.status}"
+        if isinstance(current, aiohttp.ClientError):
+            return "connection"
+        if isinstance(current, ValueError):
+            return "decode"
+        current = current.__cause__ or current.__context__
+    category = getattr(err, "category", None)
+    return category if isinstance(category, str) else "other"
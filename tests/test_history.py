@@ -0,0 +1,29 @@
+"""Tests for turning a day of history into hourly statistics."""
+from datetime import date
+
+import pytest
+
+from _kstar import load
+
+models = load("models")
+HistoryDay = models.HistoryDay
+
+DAY = date(2024, 6, 1)
+
+
+def test_curve_is_scaled_to_the_day_total():
+    history = HistoryDay("1", DAY, 2.0, ((36000, 1000), (39600, 1000)))
+    hours = history.hourly_energy()
+    assert hours[10] == pytest.approx(2.0)
+    assert sum(hours) == pytest.approx(2.0)
+
+
+@pytest.mark.parametrize("curve", [(), ((43200, 500),)])
+def test_day_total_without_usable_curve_is_spread_over_daylight(curve):
+    hours = HistoryDay("1", DAY, 12.5, curve).hourly_energy()
+    assert sum(hours) == pytest.approx(12.5)
+    assert all(hours[hour] == 0 for hour in range(24) if hour not in models.DAYLIGHT_HOURS)
+
+
+def test_day_without_total_or_curve_adds_nothing():
+    assert sum(HistoryDay("1", DAY, None, ()).hourly_energy()) == 0
@@ -0,0 +1,97 @@
+"""Tests for the local realPower integrator."""
+import pytest
+
+from _kstar import load
+
+PowerIntegrator = load("integrator").PowerIntegrator
+
+DAY = 86400.0
+
+
+def test_trapezoid_energy():
+    integrator = PowerIntegrator()
+    assert integrator.add(0, 1000, 0)
+    assert integrator.add(1800, 2000, 0)
+    # (1000 + 2000) / 2 W for half an hour
+    assert integrator.day_energy == pytest.approx(0.75)
+
+
+def test_midnight_splits_the_interval():
+    integrator = PowerIntegrator()
+    integrator.add(DAY - 600, 1000, 0)
+    integrator.add(DAY + 600, 1000, DAY)
+    # Only the ten minutes after midnight count towards the new day
+    assert integrator.day_energy == pytest.approx(1000 * 600 / 3600 / 1000)
+
+
+def test_gap_longer_than_max_gap_is_not_integrated():
+    integrator = PowerIntegrator(max_gap=3600)
+    integrator.add(0, 1000, 0)
+    integrator.add(7200, 1000, 0)
+    assert integrator.day_energy == 0
+    assert integrator.average_power == 1000
+
+    integrator.add(7500, 2000, 0)
+    assert integrator.day_energy == pytest.approx(1500 * 300 / 3600 / 1000)
+
+
+def test_window_evicts_peak_and_average():
+    integrator = PowerIntegrator(window=600)
+    integrator.add(0, 100, 0)
+    integrator.add(300, 500, 0)
+    integrator.add(600, 200, 0)
+    assert integrator.peak_power == 500
+
+    integrator.add(1000, 100, 0)
+    assert integrator.sample_count == 2
+    assert integrator.peak_power == 200
+    # Trapezoids ending at 600 (300 s) and 1000 (400 s) remain
+    assert integrator.average_power == pytest.approx((350 * 300 + 150 * 400) / 700)
+
+
+def test_cloud_value_becomes_the_base():
+    integrator = PowerIntegrator()
+    integrator.add(0, 1000, 0, day_generation=2.0)
+    integrator.add(3600, 1000, 0, day_generation=2.0)
+    assert integrator.day_energy == pytest.approx(3.0)
+
+    integrator.add(7200, 1000, 0, day_generation=3.5)
+    assert integrator.drift_kwh == pytest.approx(0.5)
+    assert integrator.day_energy == pytest.approx(3.5)
+
+
+def test_new_day_resets_cloud_base():
+    integrator = PowerIntegrator()
+    integrator.add(DAY - 60, 0, 0, day_generation=12.0)
+    integrator.add(DAY + 60, 0, DAY)
+    assert integrator.day_energy == 0
+    assert integrator.drift_kwh is None
+
+
+def test_day_start_follows_samples_not_the_clock():
+    integrator = PowerIntegrator()
+    assert integrator.day_start is None
+    integrator.add(DAY - 60, 1000, 0)
+    # Still yesterday's total until the first sample after midnight
+    assert integrator.day_start == 0
+    integrator.add(DAY + 60, 1000, DAY)
+    assert integrator.day_start == DAY
+
+
+def test_sample_not_newer_than_the_last_is_ignored():
+    integrator = PowerIntegrator()
+    assert integrator.add(100, 500, 0)
+    # Same cached payload served again, or an older one
+    assert not integrator.add(100, 500, 0)
+    assert not integrator.add(50, 800, 0, day_generation=9.0)
+    assert integrator.sample_count == 1
+    assert integrator.day_energy == 0
+
+
+def test_capacity_factor():
+    integrator = PowerIntegrator(capacity=2.0)
+    integrator.add(0, 1000, 0)
+    integrator.add(3600, 1000, 0)
+    # 1 kWh from 2 kWp over one hour
+    assert integrator.capacity_factor(3600) == pytest.approx(50.0)
+    assert PowerIntegrator().capacity_factor(3600) is None
@@ -0,0 +1,30 @@
+"""Import the integration's Home Assistant free modules from a plain Python process.
+
+``custom_components/kstar_solar/__init__.py`` imports Home Assistant, so the
+client modules are loaded through a stand-in package that points at the same
+directory but skips the package ``__init__``.
+"""
+import importlib
+import sys
+import types
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PACKAGE_DIR = REPO_ROOT / "custom_components" / "kstar_solar"
+PACKAGE_NAME = "kstar_solar"
+
+
+def load(module: str) -> types.ModuleType:
+    """Return ``kstar_solar.<module>`` without importing Home Assistant."""
+    if PACKAGE_NAME not in sys.modules:
+        package = types.ModuleType(PACKAGE_NAME)
+        package.__path__ = [str(PACKAGE_DIR)]
+        sys.modules[PACKAGE_NAME] = package
+    return importlib.import_module(f"{PACKAGE_NAME}.{module}")
+
+
+def load_with_homeassistant(module: str) -> types.ModuleType:
+    """Return ``custom_components.kstar_solar.<module>``; requires Home Assistant."""
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    return importlib.import_module(f"custom_components.kstar_solar.{module}")
@@ -0,0 +1,194 @@
+"""Startup benchmark for the Kstar Solar integration.
+
+Measures two things that decide how long Home Assistant waits on us at boot:
+
+* import cost of each integration module, in fresh interpreters that have
+  already imported the Home Assistant core modules every integration shares;
+* time until entities have values, comparing a blocking first refresh
+  against the mock cloud with restoring from the snapshot journal.
+
+    python tools/bench_startup.py --repeat 5 --stations 50 --latency 300
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from _kstar import REPO_ROOT, load_with_homeassistant
+from mock_kstar_server import MockConfig, start_server
+
+# Home Assistant 启动时已经导入的模块，不计入集成的导入成本
+HA_BASELINE = (
+    "homeassistant.core",
+    "homeassistant.config_entries",
+    "homeassistant.const",
+    "homeassistant.helpers.entity_platform",
+    "homeassistant.helpers.storage",
+    "homeassistant.helpers.update_coordinator",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.components.sensor",
+)
+
+MODULES = (
+    "custom_components.kstar_solar",
+    "custom_components.kstar_solar.sensor",
+    "custom_components.kstar_solar.diagnostics",
+    "custom_components.kstar_solar.config_flow",
+    "custom_components.kstar_solar.backfill",
+)
+
+_IMPORT_PROBE = """
+import importlib, json, sys, time
+for name in {baseline!r}:
+    try:
+        importlib.import_module(name)
+    except Exception:
+        pass
+before = set(sys.modules)
+start = time.perf_counter()
+try:
+    importlib.import_module({module!r})
+    error = None
+except Exception as err:
+    error = f"{{type(err).__name__}}: {{err}}"
+elapsed = time.perf_counter() - start
+new = sorted(set(sys.modules) - before)
+print(json.dumps({{"seconds": elapsed, "error": error, "modules": new}}))
+"""
+
+
+def measure_import(module: str, repeat: int) -> dict[str, Any]:
+    """Import ``module`` in ``repeat`` fresh interpreters and summarise."""
+    timings: list[float] = []
+    result: dict[str, Any] = {}
+    for _ in range(repeat):
+        probe = _IMPORT_PROBE.format(baseline=HA_BASELINE, module=module)
+        completed = subprocess.run(
+            [sys.executable, "-c", probe],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        try:
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            return {"module": module, "error": completed.stderr.strip().splitlines()[-1:]}
+        if result["error"]:
+            return {"module": module, "error": result["error"]}
+        timings.append(result["seconds"])
+
+    foreign = sorted(
+        {name.split(".")[0] for name in result["modules"]} - {"custom_components"}
+    )
+    return {
+        "module": module,
+        "import_ms": round(statistics.median(timings) * 1000, 2),
+        "new_modules": len(result["modules"]),
+        # 除集成自身以外被顺带导入的顶层包
+        "pulled_in": foreign,
+    }
+
+
+async def measure_first_values(args: argparse.Namespace) -> dict[str, Any]:
+    """Time a cold first refresh against restoring the journal it wrote."""
+    from homeassistant.core import HomeAssistant
+
+    kstar_api = load_with_homeassistant("kstar_api")
+    coordinator_module = load_with_homeassistant("coordinator")
+    journal_module = load_with_homeassistant("journal")
+
+    _, runner, url = await start_server(
+        MockConfig(stations=args.stations, latency=args.latency / 1000, latency_jitter=0)
+    )
+    config_dir = tempfile.mkdtemp(prefix="kstar_startup_")
+    hass = HomeAssistant(config_dir)
+    journal = journal_module.SnapshotJournal(Path(config_dir) / "journal")
+    station_ids = [str(i) for i in range(1, args.stations + 1)]
+
+    def build() -> tuple[Any, Any]:
+        api = kstar_api.KstarSolarAPI(
+            host=url,
+            station_id=station_ids[0],
+            username="bench",
+            password="bench",
+            max_concurrency=args.concurrency,
+            rate_limit=0,
+        )
+        return api, coordinator_module.KstarSolarCoordinator(
+            hass, api, station_ids, journal=journal
+        )
+
+    try:
+        api, coordinator = build()
+        start = time.perf_counter()
+        await coordinator.async_refresh()
+        blocking = time.perf_counter() - start
+        await api.close()
+
+        api, coordinator = build()
+        start = time.perf_counter()
+        restored = await coordinator.async_restore()
+        restore = time.perf_counter() - start
+        await api.close()
+    finally:
+        await runner.cleanup()
+        await hass.async_stop(force=True)
+
+    return {
+        "stations": args.stations,
+        "cloud_latency_ms": args.latency,
+        "first_refresh_ms": round(blocking * 1000, 1),
+        "journal_restore_ms": round(restore * 1000, 1),
+        "restored": restored,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="每个模块导入的次数")
+    parser.add_argument("--stations", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=300, help="模拟服务器延迟（毫秒）")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--skip-setup", action="store_true", help="只测导入耗时")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    result: dict[str, Any] = {
+        "imports": [measure_import(module, args.repeat) for module in MODULES]
+    }
+    if not args.skip_setup:
+        try:
+            result["first_values"] = asyncio.run(measure_first_values(args))
+        except ImportError as err:
+            result["first_values"] = {"error": f"Home Assistant not importable: {err}"}
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+        return
+    for item in result["imports"]:
+        if "error" in item:
+            print(f"{item['module']:<45}  error: {item['error']}")
+        else:
+            pulled = ", ".join(item["pulled_in"]) or "-"
+            print(
+                f"{item['module']:<45}  {item['import_ms']:>8.2f} ms"
+                f"  {item['new_modules']:>4} modules  pulls in: {pulled}"
+            )
+    for key, value in result.get("first_values", {}).items():
+        print(f"{key:<20}  {value}")
+
+
+if __name__ == "__main__":
+    main()
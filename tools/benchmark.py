@@ -0,0 +1,233 @@
+"""End-to-end benchmark of the Kstar client against the mock cloud.
+
+Starts ``mock_kstar_server`` in-process (or targets ``--url``), then runs
+poll rounds the way the coordinator does: one batched fetch of every station
+followed by parsing into ``StationSnapshot``. With ``--coordinator`` and Home
+Assistant installed, rounds go through ``KstarSolarCoordinator`` itself.
+
+    python tools/benchmark.py --stations 500 --rounds 20 --token-ttl 30
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable
+
+import aiohttp
+
+from _kstar import load, load_with_homeassistant
+from mock_kstar_server import MockConfig, start_server
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def fetch_stats(session: aiohttp.ClientSession, url: str) -> dict[str, Any]:
+    async with session.get(f"{url}/__stats") as response:
+        return await response.json()
+
+
+Poller = tuple[Callable[[], Awaitable[dict]], Callable[[], Awaitable[None]], Any]
+
+
+async def build_client_poller(
+    args: argparse.Namespace, url: str, station_ids: list[str]
+) -> Poller:
+    """Poll through KstarSolarAPI and StationSnapshot only."""
+    kstar_api = load("kstar_api")
+    models = load("models")
+    api = kstar_api.KstarSolarAPI(
+        host=url,
+        station_id=station_ids[0],
+        username="bench",
+        password="bench",
+        max_concurrency=args.concurrency,
+        rate_limit=args.rate_limit,
+    )
+
+    async def poll() -> dict:
+        results = await api.get_stations_data(station_ids)
+        return {
+            station_id: models.StationSnapshot.from_payload(station_id, result)
+            for station_id, result in results.items()
+            if not isinstance(result, Exception)
+        }
+
+    return poll, api.close, api
+
+
+async def build_coordinator_poller(
+    args: argparse.Namespace, url: str, station_ids: list[str]
+) -> Poller:
+    """Poll through the real KstarSolarCoordinator (needs Home Assistant)."""
+    from homeassistant.core import HomeAssistant
+
+    kstar_api = load_with_homeassistant("kstar_api")
+    coordinator_module = load_with_homeassistant("coordinator")
+    hass = HomeAssistant(tempfile.mkdtemp(prefix="kstar_bench_"))
+    api = kstar_api.KstarSolarAPI(
+        host=url,
+        station_id=station_ids[0],
+        username="bench",
+        password="bench",
+        max_concurrency=args.concurrency,
+        rate_limit=args.rate_limit,
+    )
+    coordinator = coordinator_module.KstarSolarCoordinator(hass, api, station_ids)
+
+    async def poll() -> dict:
+        await coordinator.async_refresh()
+        if not coordinator.last_update_success:
+            raise RuntimeError(f"Coordinator update failed: {coordinator.last_exception}")
+        return coordinator.data
+
+    async def close() -> None:
+        await coordinator.async_shutdown()
+        await api.close()
+
+    return poll, close, api
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    runner = None
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        config = MockConfig(
+            stations=args.stations,
+            latency=args.latency / 1000,
+            latency_jitter=args.latency / 4000,
+            token_ttl=args.token_ttl,
+            error_rate=args.error_rate,
+        )
+        _, runner, url = await start_server(config)
+
+    station_ids = [str(i) for i in range(1, args.stations + 1)]
+    builder = build_coordinator_poller if args.coordinator else build_client_poller
+    poll, close, api = await builder(args, url, station_ids)
+
+    stats_session = aiohttp.ClientSession()
+    before = await fetch_stats(stats_session, url)
+    poll_latencies: list[float] = []
+    failures = 0
+    data: dict = {}
+
+    started = time.perf_counter()
+    warmed_up: dict = {}
+    warmed_up_at = started
+    try:
+        for index in range(args.rounds):
+            round_start = time.perf_counter()
+            try:
+                data = await poll()
+            except Exception as err:  # pylint: disable=broad-except
+                failures += 1
+                print(f"poll failed: {err}", file=sys.stderr)
+            poll_latencies.append(time.perf_counter() - round_start)
+            if index == 0:
+                # 首轮必然登录一次，登录频率只统计之后的轮次
+                warmed_up = await fetch_stats(stats_session, url)
+                warmed_up_at = time.perf_counter()
+            if args.interval:
+                await asyncio.sleep(args.interval)
+        elapsed = time.perf_counter() - started
+        steady_elapsed = time.perf_counter() - warmed_up_at
+        steady = await fetch_stats(stats_session, url)
+
+        # 只统计每个电站保留下来的快照占用的内存
+        data = {}
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.take_snapshot()
+        data = await poll()
+        gc.collect()
+        retained = tracemalloc.take_snapshot().compare_to(baseline, "filename")
+        tracemalloc.stop()
+        retained_bytes = sum(stat.size_diff for stat in retained if stat.size_diff > 0)
+
+        after = await fetch_stats(stats_session, url)
+    finally:
+        await stats_session.close()
+        await close()
+        if runner is not None:
+            await runner.cleanup()
+
+    requests = sum(
+        after[key] - before[key] for key in ("logins", "refreshes", "detail_requests")
+    )
+    logins = after["logins"] - before["logins"]
+    steady_logins = steady["logins"] - warmed_up["logins"] if warmed_up else 0
+    return {
+        "mode": "coordinator" if args.coordinator else "client",
+        "stations": args.stations,
+        "rounds": args.rounds,
+        "failed_rounds": failures,
+        "elapsed_s": round(elapsed, 3),
+        "requests": requests,
+        "requests_per_s": round(requests / elapsed, 1) if elapsed else 0.0,
+        "poll_p50_ms": round(percentile(poll_latencies, 50) * 1000, 1),
+        "poll_p99_ms": round(percentile(poll_latencies, 99) * 1000, 1),
+        "poll_mean_ms": round(statistics.fmean(poll_latencies) * 1000, 1),
+        "logins": logins,
+        "refreshes": after["refreshes"] - before["refreshes"],
+        "unauthorized": after["unauthorized"] - before["unauthorized"],
+        # 首轮之后的登录次数，正常应为 0，除非 token 过期或被拒
+        "logins_after_first_poll": steady_logins,
+        "logins_per_hour": (
+            round(steady_logins / steady_elapsed * 3600, 1) if steady_elapsed and warmed_up else 0.0
+        ),
+        "bytes_per_station": round(retained_bytes / max(len(data), 1)),
+        # 客户端侧每个响应的解码和校验耗时
+        "decode_mean_us": _mean_us(api.stats.timers["decode"]),
+        "parse_mean_us": _mean_us(api.stats.timers["parse"]),
+        # 协调器模式下每个电站构建快照的耗时
+        "snapshot_mean_us": _mean_us(api.stats.timers["snapshot"]),
+    }
+
+
+def _mean_us(histogram: Any) -> float:
+    return round(histogram.total / histogram.count * 1e6, 1) if histogram.count else 0.0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="使用已启动的模拟服务器，而不是进程内启动")
+    parser.add_argument("--stations", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.0, help="两轮之间的间隔（秒）")
+    parser.add_argument("--latency", type=float, default=50, help="模拟服务器延迟（毫秒）")
+    parser.add_argument("--token-ttl", type=float, default=3600, help="模拟 token 有效期（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="每秒请求数，0 不限制")
+    parser.add_argument("--coordinator", action="store_true", help="通过 KstarSolarCoordinator 轮询")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result))
+        return
+    width = max(len(key) for key in result)
+    for key, value in result.items():
+        print(f"{key:<{width}}  {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Headless collector polling Kstar stations outside Home Assistant.
+
+Polls every station of an account concurrently through ``KstarSolarAPI``
+over one keep-alive session, and streams each parsed snapshot as NDJSON or
+CSV to stdout or to size-rotated files. ``--prometheus`` additionally
+serves the latest values in the Prometheus text format.
+
+    KSTAR_USERNAME=me KSTAR_PASSWORD=... python tools/kstar_collector.py \\
+        --stations-file stations.txt --interval 300 --format csv \\
+        --output kstar.csv --prometheus 9108
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import IO, Any
+
+from aiohttp import web
+
+from _kstar import load
+
+const = load("const")
+kstar_api = load("kstar_api")
+models = load("models")
+
+_LOGGER = logging.getLogger("kstar_collector")
+
+FIELDS = list(models.SNAPSHOT_FIELDS)
+METRIC_PREFIX = "kstar"
+
+
+def read_station_ids(args: argparse.Namespace) -> list[str]:
+    """Collect station ids from ``--stations`` and ``--stations-file``."""
+    values = list(args.stations or [])
+    if args.stations_file:
+        text = sys.stdin.read() if args.stations_file == "-" else Path(args.stations_file).read_text()
+        values.extend(line.split("#", 1)[0] for line in text.splitlines())
+    return kstar_api.parse_station_ids(",".join(values))
+
+
+def snapshot_record(snapshot: Any) -> dict[str, Any]:
+    """Flatten a snapshot into one output record keyed by API field names."""
+    record: dict[str, Any] = {
+        "station_id": snapshot.station_id,
+        "fetched_at": round(snapshot.fetched_at, 3),
+    }
+    record.update((key, snapshot.get(key)) for key in FIELDS)
+    return record
+
+
+class RotatingOutput:
+    """Write lines to stdout, or to a file rotated once it reaches ``max_bytes``."""
+
+    def __init__(
+        self, path: str | None, fmt: str, max_bytes: int, backups: int
+    ) -> None:
+        self.path = Path(path) if path and path != "-" else None
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file: IO[str] | None = None
+        self._size = 0
+
+    def write(self, records: list[dict[str, Any]]) -> None:
+        if not records:
+            return
+        stream = self._stream()
+        data = self._encode(records, header=self.fmt == "csv" and self._size == 0)
+        size = len(data.encode())
+        if self.path is not None and self._size and self._size + size > self.max_bytes:
+            self._rotate()
+            stream = self._stream()
+            data = self._encode(records, header=self.fmt == "csv")
+            size = len(data.encode())
+        stream.write(data)
+        stream.flush()
+        self._size += size
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _stream(self) -> IO[str]:
+        if self.path is None:
+            return sys.stdout
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("a", encoding="utf-8", newline="")
+            self._size = self.path.stat().st_size
+        return self._file
+
+    def _encode(self, records: list[dict[str, Any]], header: bool) -> str:
+        if self.fmt == "ndjson":
+            return "".join(
+                json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                for record in records
+            )
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=["station_id", "fetched_at", *FIELDS])
+        if header:
+            writer.writeheader()
+        writer.writerows(records)
+        return buffer.getvalue()
+
+    def _rotate(self) -> None:
+        self.close()
+        assert self.path is not None
+        paths = [self.path] + [
+            self.path.with_name(f"{self.path.name}.{index}")
+            for index in range(1, self.backups + 1)
+        ]
+        if len(paths) == 1:
+            self.path.unlink(missing_ok=True)
+        for older, newer in zip(reversed(paths[1:]), reversed(paths[:-1])):
+            if newer.exists():
+                os.replace(newer, older)
+        self._size = 0
+
+
+class Collector:
+    """Poll loop plus the latest values for the metrics endpoint."""
+
+    def __init__(self, api: Any, station_ids: list[str], output: RotatingOutput) -> None:
+        self.api = api
+        self.station_ids = station_ids
+        self.output = output
+        self.latest: dict[str, Any] = {}
+        self.polls = 0
+        self.failed_stations = 0
+        self.last_poll_seconds: float | None = None
+
+    async def poll_once(self) -> None:
+        started = time.perf_counter()
+        results = await self.api.get_stations_data(self.station_ids)
+        fresh = []
+        for station_id, result in results.items():
+            if isinstance(result, Exception):
+                self.failed_stations += 1
+                _LOGGER.warning("Station %s failed: %s", station_id, result)
+                continue
+            # 熔断或缓存返回的是上次的数据，按真实获取时间记录且不重复输出
+            fetched_at = time.time() - (self.api.data_age(station_id) or 0.0)
+            previous = self.latest.get(station_id)
+            if previous is not None and previous.fetched_at >= fetched_at - 1:
+                continue
+            snapshot = models.StationSnapshot.from_payload(station_id, result, fetched_at)
+            self.latest[station_id] = snapshot
+            fresh.append(snapshot_record(snapshot))
+        self.output.write(fresh)
+        self.polls += 1
+        self.last_poll_seconds = time.perf_counter() - started
+
+    async def run(self, interval: float) -> None:
+        while True:
+            await self.poll_once()
+            if interval <= 0:
+                return
+            # 按固定节奏轮询，轮询本身的耗时计入间隔
+            await asyncio.sleep(max(0.0, interval - (self.last_poll_seconds or 0.0)))
+
+    def render_metrics(self) -> str:
+        """Return the latest values in the Prometheus text exposition format."""
+        lines: list[str] = []
+        for key, attr in models.SNAPSHOT_FIELDS.items():
+            name = f"{METRIC_PREFIX}_station_{attr}"
+            samples = [
+                (station_id, value)
+                for station_id, snapshot in sorted(self.latest.items())
+                if (value := snapshot.get(key)) is not None
+            ]
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} Station field {key}.")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(
+                f'{name}{{station_id="{_escape(station_id)}"}} {value}'
+                for station_id, value in samples
+            )
+
+        name = f"{METRIC_PREFIX}_station_fetched_timestamp_seconds"
+        lines.append(f"# HELP {name} When the station was last fetched successfully.")
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(
+            f'{name}{{station_id="{_escape(station_id)}"}} {snapshot.fetched_at:.3f}'
+            for station_id, snapshot in sorted(self.latest.items())
+        )
+
+        stats = self.api.stats
+        lines.append(f"# TYPE {METRIC_PREFIX}_client_events_total counter")
+        lines.extend(
+            f'{METRIC_PREFIX}_client_events_total{{event="{event}"}} {count}'
+            for event, count in sorted(stats.counters.items())
+        )
+        lines.append(f"# TYPE {METRIC_PREFIX}_client_errors_total counter")
+        lines.extend(
+            f'{METRIC_PREFIX}_client_errors_total{{category="{_escape(category)}"}} {count}'
+            for category, count in sorted(stats.errors.items())
+        )
+        lines.append(f"# TYPE {METRIC_PREFIX}_collector_polls_total counter")
+        lines.append(f"{METRIC_PREFIX}_collector_polls_total {self.polls}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_collector_failed_stations_total counter")
+        lines.append(f"{METRIC_PREFIX}_collector_failed_stations_total {self.failed_stations}")
+        if self.last_poll_seconds is not None:
+            lines.append(f"# TYPE {METRIC_PREFIX}_collector_poll_duration_seconds gauge")
+            lines.append(
+                f"{METRIC_PREFIX}_collector_poll_duration_seconds {self.last_poll_seconds:.6f}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+async def start_metrics_server(collector: Collector, host: str, port: int) -> web.AppRunner:
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            text=collector.render_metrics(), content_type="text/plain", charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    _LOGGER.info("Serving metrics on http://%s:%d/metrics", host, port)
+    return runner
+
+
+def _load_tokens(api: Any, path: str | None) -> None:
+    if not path or not Path(path).exists():
+        return
+    try:
+        api.restore_tokens(json.loads(Path(path).read_text()))
+    except (OSError, ValueError) as err:
+        _LOGGER.warning("Ignoring token file %s: %s", path, err)
+
+
+def _save_tokens(path: str, tokens: dict[str, Any]) -> None:
+    tmp = Path(f"{path}.tmp")
+    tmp.write_text(json.dumps(tokens))
+    os.replace(tmp, path)
+
+
+async def run(args: argparse.Namespace) -> None:
+    station_ids = read_station_ids(args)
+    if not station_ids:
+        raise SystemExit("No station ids given; use --stations or --stations-file")
+    username = args.username or os.environ.get("KSTAR_USERNAME")
+    password = args.password or os.environ.get("KSTAR_PASSWORD")
+    if not username or not password:
+        raise SystemExit("Username and password are required (or KSTAR_USERNAME/KSTAR_PASSWORD)")
+
+    session = kstar_api.create_session(max(args.concurrency, 1))
+    api = kstar_api.KstarSolarAPI(
+        host=args.host,
+        station_id=station_ids[0],
+        username=username,
+        password=password,
+        timeout=args.timeout,
+        session=session,
+        max_concurrency=args.concurrency,
+        rate_limit=args.rate_limit,
+    )
+    # 持久化 token，重启采集器时不必重新登录
+    _load_tokens(api, args.token_file)
+    if args.token_file:
+        api.set_token_listener(lambda tokens: _save_tokens(args.token_file, tokens))
+
+    output = RotatingOutput(args.output, args.format, args.max_bytes, args.backups)
+    collector = Collector(api, station_ids, output)
+    runner = None
+    try:
+        if args.prometheus:
+            runner = await start_metrics_server(collector, args.prometheus_host, args.prometheus)
+        await collector.run(args.interval)
+    finally:
+        output.close()
+        if runner is not None:
+            await runner.cleanup()
+        await api.close()
+        await session.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=const.DEFAULT_HOST, help="后台地址")
+    parser.add_argument("--username", help="默认读取环境变量 KSTAR_USERNAME")
+    parser.add_argument("--password", help="加密后的密码，默认读取环境变量 KSTAR_PASSWORD")
+    parser.add_argument("--stations", action="append", help="电站ID，可用逗号分隔，可重复")
+    parser.add_argument("--stations-file", help="每行一个电站ID的文件，- 表示标准输入")
+    parser.add_argument("--interval", type=float, default=0.0, help="轮询间隔（秒），0 表示只采集一次")
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--output", help="输出文件，默认标准输出")
+    parser.add_argument("--max-bytes", type=int, default=64 * 1024 * 1024, help="输出文件轮转大小")
+    parser.add_argument("--backups", type=int, default=5, help="保留的轮转文件数")
+    parser.add_argument("--prometheus", type=int, metavar="PORT", help="在该端口提供 /metrics")
+    parser.add_argument("--prometheus-host", default="127.0.0.1")
+    parser.add_argument("--token-file", help="保存和恢复 token 的 JSON 文件")
+    parser.add_argument("--concurrency", type=int, default=const.DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--rate-limit", type=float, default=const.DEFAULT_RATE_LIMIT, help="每秒请求数，0 不限制")
+    parser.add_argument("--timeout", type=int, default=30)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+        stream=sys.stderr,
+    )
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""Local stand-in for the Kstar cloud, for development and benchmarks.
+
+Implements the login, token refresh, station detail, inverter and history
+endpoints used by ``KstarSolarAPI`` with configurable latency, token
+lifetime and error injection.
+
+    python tools/mock_kstar_server.py --stations 2000 --latency 80 --token-ttl 600
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import random
+import secrets
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from aiohttp import web
+
+from _kstar import load
+
+const = load("const")
+
+REFRESH_URL = "/prod-api/oauth/token"
+STATS_URL = "/__stats"
+
+
+@dataclass
+class MockConfig:
+    """Behaviour of the mock cloud."""
+
+    stations: int = 100
+    inverters: int = 2  # 每个电站的逆变器数
+    latency: float = 0.05  # 秒
+    latency_jitter: float = 0.02
+    token_ttl: float = 3600
+    error_rate: float = 0.0  # 返回 HTTP 503 的比例
+    api_error_rate: float = 0.0  # 返回 code != 200 的比例
+    rate_limit_rate: float = 0.0  # 返回 HTTP 429 的比例
+    retry_after: float = 1.0  # 429 响应的 Retry-After（秒）
+    password: str | None = None  # 为 None 时接受任意密码
+    seed: int = 0
+
+
+@dataclass
+class MockStats:
+    """Request counters, served on ``/__stats``."""
+
+    logins: int = 0
+    refreshes: int = 0
+    detail_requests: int = 0
+    inverter_requests: int = 0
+    history_requests: int = 0
+    unauthorized: int = 0
+    injected_errors: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+
+class MockKstarCloud:
+    """aiohttp application emulating the Kstar cloud endpoints."""
+
+    def __init__(self, config: MockConfig) -> None:
+        self.config = config
+        self.stats = MockStats()
+        self._random = random.Random(config.seed)
+        self._access_tokens: dict[str, float] = {}
+        self._refresh_tokens: set[str] = set()
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(const.LOGIN_URL, self.handle_login)
+        app.router.add_post(REFRESH_URL, self.handle_refresh)
+        app.router.add_get(const.STATION_DETAIL_URL, self.handle_station_detail)
+        app.router.add_get(const.INVERTER_LIST_URL, self.handle_inverter_list)
+        app.router.add_get(const.INVERTER_DETAIL_URL, self.handle_inverter_detail)
+        app.router.add_get(const.STATION_DAY_CURVE_URL, self.handle_day_curve)
+        app.router.add_get(const.STATION_MONTH_GENERATION_URL, self.handle_month_generation)
+        app.router.add_get(STATS_URL, self.handle_stats)
+        return app
+
+    async def _delay(self) -> None:
+        jitter = self._random.uniform(-1, 1) * self.config.latency_jitter
+        await asyncio.sleep(max(0.0, self.config.latency + jitter))
+
+    def _issue_token(self) -> dict:
+        access_token = secrets.token_hex(16)
+        refresh_token = secrets.token_hex(16)
+        self._access_tokens[access_token] = time.monotonic() + self.config.token_ttl
+        self._refresh_tokens.add(refresh_token)
+        return {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "expires_in": int(self.config.token_ttl),
+        }
+
+    async def handle_login(self, request: web.Request) -> web.Response:
+        self.stats.logins += 1
+        form = await request.post()
+        await self._delay()
+        if self.config.password is not None and form.get("password") != self.config.password:
+            return web.json_response({"code": 400, "message": "用户名或密码错误"})
+        return web.json_response({"code": 200, "token": self._issue_token()})
+
+    async def handle_refresh(self, request: web.Request) -> web.Response:
+        self.stats.refreshes += 1
+        form = await request.post()
+        await self._delay()
+        refresh_token = form.get("refresh_token")
+        if refresh_token not in self._refresh_tokens:
+            return web.json_response({"error": "invalid_grant"}, status=400)
+        self._refresh_tokens.discard(refresh_token)
+        token = self._issue_token()
+        return web.json_response(
+            {
+                "value": token["access_token"],
+                "expiresIn": token["expires_in"],
+                "refreshToken": {"value": token["refresh_token"]},
+            }
+        )
+
+    def _reject(self, request: web.Request) -> web.Response | None:
+        """Return an error response for bad tokens and injected failures."""
+        auth = request.headers.get("Authorization", "")
+        token = auth[len("bearer "):] if auth.lower().startswith("bearer ") else ""
+        expires_at = self._access_tokens.get(token)
+        if expires_at is None or expires_at < time.monotonic():
+            self._access_tokens.pop(token, None)
+            self.stats.unauthorized += 1
+            return web.json_response({"error": "invalid_token"}, status=401)
+
+        if self._random.random() < self.config.error_rate:
+            self.stats.injected_errors += 1
+            return web.Response(status=503, text="Service Unavailable")
+        if self._random.random() < self.config.rate_limit_rate:
+            self.stats.injected_errors += 1
+            return web.Response(
+                status=429,
+                text="Too Many Requests",
+                headers={"Retry-After": f"{self.config.retry_after:g}"},
+            )
+        if self._random.random() < self.config.api_error_rate:
+            self.stats.injected_errors += 1
+            return web.json_response({"code": 500, "message": "系统繁忙"})
+        return None
+
+    def _station_number(self, value: str) -> int | None:
+        if not value.isdigit() or not 1 <= int(value) <= self.config.stations:
+            return None
+        return int(value)
+
+    async def handle_station_detail(self, request: web.Request) -> web.Response:
+        self.stats.detail_requests += 1
+        await self._delay()
+        if (rejected := self._reject(request)) is not None:
+            return rejected
+
+        station_number = self._station_number(request.query.get("stationId", ""))
+        if station_number is None:
+            return web.json_response({"code": 500, "message": "电站不存在"})
+        return web.json_response({"code": 200, "data": station_payload(station_number)})
+
+    async def handle_inverter_list(self, request: web.Request) -> web.Response:
+        self.stats.inverter_requests += 1
+        await self._delay()
+        if (rejected := self._reject(request)) is not None:
+            return rejected
+
+        station_number = self._station_number(request.query.get("stationId", ""))
+        if station_number is None:
+            return web.json_response({"code": 500, "message": "电站不存在"})
+        inverters = [
+            {
+                "inverterId": f"{station_number}-{index}",
+                "sn": f"KS{station_number:06d}{index:02d}",
+                "name": f"逆变器{index}",
+                "model": "KSG-10K",
+            }
+            for index in range(1, self.config.inverters + 1)
+        ]
+        return web.json_response({"code": 200, "data": inverters})
+
+    async def handle_inverter_detail(self, request: web.Request) -> web.Response:
+        self.stats.inverter_requests += 1
+        await self._delay()
+        if (rejected := self._reject(request)) is not None:
+            return rejected
+
+        station, _, index = request.query.get("inverterId", "").partition("-")
+        station_number = self._station_number(station)
+        if station_number is None or not index.isdigit():
+            return web.json_response({"code": 500, "message": "逆变器不存在"})
+        # 电站的数值平均分给各台逆变器
+        station = station_payload(station_number)
+        share = max(self.config.inverters, 1)
+        return web.json_response(
+            {
+                "code": 200,
+                "data": {
+                    "inverterId": request.query["inverterId"],
+                    "power": str(round(float(station["realPower"]) / share, 1)),
+                    "dayGeneration": str(round(float(station["dayGeneration"]) / share, 2)),
+                    "totalGeneration": str(round(float(station["totalGeneration"]) / share, 2)),
+                },
+            }
+        )
+
+    async def handle_day_curve(self, request: web.Request) -> web.Response:
+        self.stats.history_requests += 1
+        await self._delay()
+        if (rejected := self._reject(request)) is not None:
+            return rejected
+
+        station_number = self._station_number(request.query.get("stationId", ""))
+        try:
+            day = date.fromisoformat(request.query.get("date", ""))
+        except ValueError:
+            day = None
+        if station_number is None or day is None:
+            return web.json_response({"code": 500, "message": "参数错误"})
+        if day >= date.today():
+            return web.json_response({"code": 200, "data": []})
+        # 每 5 分钟一个点
+        capacity = station_capacity(station_number)
+        curve = [
+            {
+                "time": f"{minute // 60:02d}:{minute % 60:02d}",
+                "power": round(capacity * sun_factor(minute / 60), 1),
+            }
+            for minute in range(0, 24 * 60, 5)
+        ]
+        return web.json_response({"code": 200, "data": curve})
+
+    async def handle_month_generation(self, request: web.Request) -> web.Response:
+        self.stats.history_requests += 1
+        await self._delay()
+        if (rejected := self._reject(request)) is not None:
+            return rejected
+
+        station_number = self._station_number(request.query.get("stationId", ""))
+        try:
+            day = date.fromisoformat(request.query.get("month", "") + "-01")
+        except ValueError:
+            day = None
+        if station_number is None or day is None:
+            return web.json_response({"code": 500, "message": "参数错误"})
+        # 正弦曲线 12 小时的积分，只返回已经过去的日期
+        total = round(station_capacity(station_number) / 1000 * 24 / math.pi, 2)
+        month = day.month
+        totals = []
+        while day.month == month and day < date.today():
+            totals.append({"date": day.isoformat(), "generation": str(total)})
+            day += timedelta(days=1)
+        return web.json_response({"code": 200, "data": totals})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        stats = self.stats
+        return web.json_response(
+            {
+                "logins": stats.logins,
+                "refreshes": stats.refreshes,
+                "detail_requests": stats.detail_requests,
+                "inverter_requests": stats.inverter_requests,
+                "history_requests": stats.history_requests,
+                "unauthorized": stats.unauthorized,
+                "injected_errors": stats.injected_errors,
+                "uptime": time.monotonic() - stats.started,
+            }
+        )
+
+
+def station_capacity(station_number: int) -> float:
+    """Return the station's peak power in W."""
+    return 3000 + (station_number * 7919) % 20000
+
+
+def sun_factor(hour: float) -> float:
+    """Return the share of peak power at a local hour, a sine from 6:00 to 18:00."""
+    return max(0.0, math.sin(math.pi * (hour - 6) / 12))
+
+
+def station_payload(station_number: int, now: float | None = None) -> dict:
+    """Return a plausible station detail payload following the sun."""
+    now = time.time() if now is None else now
+    local = time.localtime(now)
+    hour = local.tm_hour + local.tm_min / 60 + local.tm_sec / 3600
+    capacity = station_capacity(station_number)
+    real_power = round(capacity * sun_factor(hour), 1)
+    daylight = min(max(hour - 6, 0.0), 12.0)
+    day_generation = round(capacity / 1000 * 12 / math.pi * (1 - math.cos(math.pi * daylight / 12)), 2)
+    total_generation = round(capacity / 1000 * 1200 + station_number, 2)
+    return {
+        "stationId": str(station_number),
+        "realPower": str(real_power),
+        "dayGeneration": str(day_generation),
+        "monthGeneration": str(round(day_generation * local.tm_mday, 2)),
+        "yearGeneration": str(round(day_generation * local.tm_yday, 2)),
+        "totalGeneration": str(total_generation),
+        "dayEarn": str(round(day_generation * 0.45, 2)),
+        "totalEarn": str(round(total_generation * 0.45, 2)),
+        "co2": str(round(total_generation * 0.997, 2)),
+        "coal": str(round(total_generation * 0.4, 2)),
+        "forest": str(round(total_generation * 0.0545, 2)),
+    }
+
+
+async def start_server(
+    config: MockConfig, host: str = "127.0.0.1", port: int = 0
+) -> tuple[MockKstarCloud, web.AppRunner, str]:
+    """Start the mock cloud and return it with its runner and base URL."""
+    cloud = MockKstarCloud(config)
+    runner = web.AppRunner(cloud.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = runner.addresses[0][1]
+    return cloud, runner, f"http://{host}:{bound_port}"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9003)
+    parser.add_argument("--stations", type=int, default=MockConfig.stations)
+    parser.add_argument("--inverters", type=int, default=MockConfig.inverters, help="每个电站的逆变器数")
+    parser.add_argument("--latency", type=float, default=MockConfig.latency * 1000, help="毫秒")
+    parser.add_argument("--latency-jitter", type=float, default=MockConfig.latency_jitter * 1000, help="毫秒")
+    parser.add_argument("--token-ttl", type=float, default=MockConfig.token_ttl, help="秒")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--api-error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--retry-after", type=float, default=MockConfig.retry_after, help="秒")
+    parser.add_argument("--password", default=None)
+    return parser
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        stations=args.stations,
+        inverters=args.inverters,
+        latency=args.latency / 1000,
+        latency_jitter=args.latency_jitter / 1000,
+        token_ttl=args.token_ttl,
+        error_rate=args.error_rate,
+        api_error_rate=args.api_error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        password=args.password,
+    )
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    cloud = MockKstarCloud(config_from_args(args))
+    web.run_app(cloud.create_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()